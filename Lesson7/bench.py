@@ -0,0 +1,256 @@
+"""
+Замеры производительности solver'а задач 19–21.
+
+  python bench.py run [--engine ege|retro] [--only ПОДСТРОКА] [--repeat N] [--out bench.json]
+  python bench.py compare old.json new.json [--tolerance 0.25]
+  python bench.py check [--only ИМЯ]
+
+Каждая пара (конфигурация, движок) считается в отдельном процессе, чтобы пиковый RSS
+относился только к ней. Результат — JSON: время solve_all и sample_strategy_*, пиковая память,
+число позиций и хэш найденных списков (compare ловит и замедления, и изменившиеся ответы).
+check — проверки поведения, которые замерами не ловятся (например, дискового кэша между запусками).
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing as mp
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core import EGESolver, GameRules, RetroSolver
+from core.cache import SolutionCache
+from core.retro import TASKS_DEPTH
+from core.session import SolverSession
+
+try:
+    import resource
+except ImportError:  # Windows — без пиковой памяти
+    resource = None
+
+ENGINES = ("ege", "retro")
+# Для скольких S из каждого списка строить стратегию
+STRATEGY_SAMPLES = 3
+
+
+@dataclass
+class BenchCase:
+    name: str
+    rules: Dict[str, Any]
+    start_template: Tuple[Optional[int], ...]
+    s_min: int
+    s_max: int
+    engines: Tuple[str, ...] = ENGINES
+    tags: List[str] = field(default_factory=list)
+
+
+def _scaled_24115(target: int) -> Dict[str, Any]:
+    return dict(target_mode="heap", target=target, finish_cmp="ge", heap_index=0, adds=[2, 5], mults=[3], heaps=1)
+
+
+CASES: List[BenchCase] = [
+    # Пресеты интерфейса
+    BenchCase("preset-24115", _scaled_24115(444), (None,), 1, 400, tags=["preset"]),
+    BenchCase("preset-18064", dict(target_mode="heap", target=27, finish_cmp="lt", heap_index=0,
+                                   adds=[-3, -4], mults=[], divs=[3], heaps=1), (None,), 27, 200, tags=["preset"]),
+    # Масштабированные пресеты
+    BenchCase("24115-1e4", _scaled_24115(10 ** 4), (None,), 1, 10 ** 4 - 1, tags=["scaled"]),
+    BenchCase("24115-1e5", _scaled_24115(10 ** 5), (None,), 1, 10 ** 5 - 1, tags=["scaled"]),
+    BenchCase("24115-1e6", _scaled_24115(10 ** 6), (None,), 1, 10 ** 6 - 1, engines=("retro",), tags=["scaled"]),
+    BenchCase("18064-1e4", dict(target_mode="heap", target=10 ** 4, finish_cmp="lt", heap_index=0,
+                                adds=[-3, -4], mults=[], divs=[3], heaps=1), (None,), 10 ** 4, 3 * 10 ** 4,
+              tags=["scaled"]),
+    BenchCase("sum2-1e4", dict(target_mode="sum", target=10 ** 4, adds=[1], mults=[2], heaps=2),
+              (7, None), 1, 10 ** 4 - 8, tags=["scaled", "two-heaps"]),
+    BenchCase("sum2-1e5", dict(target_mode="sum", target=10 ** 5, adds=[1], mults=[2], heaps=2),
+              (7, None), 1, 10 ** 5 - 8, engines=("retro",), tags=["scaled", "two-heaps"]),
+    # Граф до глубины TASKS_DEPTH: ~20 с и ~5 ГБ пикового RSS
+    BenchCase("sum2-1e6", dict(target_mode="sum", target=10 ** 6, adds=[1], mults=[2], heaps=2),
+              (7, None), 1, 10 ** 6 - 8, engines=("retro",), tags=["scaled", "two-heaps"]),
+    BenchCase("mixed2-1e4", dict(target_mode="max", target=10 ** 4, adds=[3, -1], mults=[2], divs=[2], heaps=2),
+              (10, None), 1, 10 ** 4 - 1, tags=["scaled", "two-heaps", "mixed"]),
+    BenchCase("mixed1-1e5", dict(target_mode="heap", target=10 ** 5, heap_index=0, adds=[1, 4, -2], mults=[3],
+                                 divs=[2], heaps=1), (None,), 1, 10 ** 5 - 1, tags=["scaled", "mixed"]),
+    # Много действий
+    BenchCase("many-actions-1", dict(target_mode="heap", target=10 ** 5, heap_index=0, adds=list(range(1, 9)),
+                                     mults=[2, 3, 4, 5], heaps=1), (None,), 1, 10 ** 5 - 1, tags=["pathological"]),
+    BenchCase("many-actions-2", dict(target_mode="sum", target=2000, adds=[1, 2, 3, 4, 5], mults=[2, 3, 4],
+                                     divs=[2], heaps=2), (3, None), 1, 1996, tags=["pathological", "two-heaps"]),
+]
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # macOS — байты, Linux — КБ
+
+
+def _make_solver(case: BenchCase, engine: str) -> EGESolver:
+    rules = GameRules(**case.rules)
+    if engine == "retro":
+        return RetroSolver(rules, case.start_template, case.s_min, case.s_max, max_depth=TASKS_DEPTH)
+    return EGESolver(rules, case.start_template, case.s_min, case.s_max)
+
+
+def _digest(lists: Tuple[List[int], ...]) -> str:
+    return hashlib.sha1(json.dumps([sorted(x) for x in lists]).encode("ascii")).hexdigest()[:16]
+
+
+def _measure(case: BenchCase, engine: str) -> Dict[str, Any]:
+    """Один замер в текущем процессе (вызывается в отдельном процессе)."""
+    solver = _make_solver(case, engine)
+    t0 = time.perf_counter()
+    lists = solver.solve_all()
+    solve_time = time.perf_counter() - t0
+
+    # Стратегии — отдельным solver'ом, как в интерфейсе (без кэшей после solve_all)
+    t0 = time.perf_counter()
+    for task, lst in zip((19, 20, 21), lists):
+        for S in lst[:STRATEGY_SAMPLES]:
+            strat = _make_solver(BenchCase(case.name, case.rules, case.start_template, S, S), engine)
+            getattr(strat, f"sample_strategy_{task}")(S)
+    strategy_time = time.perf_counter() - t0
+
+    report = solver.stats_report()
+    return dict(
+        solve_time=solve_time,
+        strategy_time=strategy_time,
+        peak_rss_mb=_peak_rss_mb(),
+        states=report["states_generated"],
+        found=[len(x) for x in lists],
+        digest=_digest(lists),
+    )
+
+
+def run(engines: List[str], only: Optional[str], repeat: int) -> Dict[str, Any]:
+    ctx = mp.get_context("spawn")
+    results = []
+    for case in CASES:
+        if only and only not in case.name and only not in case.tags:
+            continue
+        for engine in case.engines:
+            if engine not in engines:
+                continue
+            runs = []
+            for _ in range(repeat):
+                with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                    runs.append(pool.submit(_measure, case, engine).result())
+            best = min(runs, key=lambda r: r["solve_time"])
+            best["strategy_time"] = min(r["strategy_time"] for r in runs)
+            best.update(case=case.name, engine=engine, repeat=repeat)
+            results.append(best)
+            print(f"{case.name:16} {engine:6} solve {best['solve_time']:8.3f}s  strategies {best['strategy_time']:7.3f}s"
+                  f"  rss {best['peak_rss_mb'] or 0:7.1f}MB  states {best['states']:>10}  found {best['found']}")
+    return dict(
+        meta=dict(python=platform.python_version(), platform=platform.platform(), created=time.time()),
+        results=results,
+    )
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any], tolerance: float) -> int:
+    """Сравнить два прогона; число регрессий (замедление больше чем на tolerance или другие ответы)."""
+    before = {(r["case"], r["engine"]): r for r in old["results"]}
+    regressions = 0
+    for r in new["results"]:
+        o = before.get((r["case"], r["engine"]))
+        if o is None:
+            continue
+        notes = []
+        for metric in ("solve_time", "strategy_time"):
+            # Доли миллисекунды — шум, а не регрессия
+            if r[metric] > o[metric] * (1 + tolerance) and r[metric] - o[metric] > 1e-3:
+                notes.append(f"{metric} ×{r[metric] / max(o[metric], 1e-9):.2f}")
+        if r["digest"] != o["digest"]:
+            notes.append(f"ответы изменились: {o['found']} → {r['found']}")
+        ratio = r["solve_time"] / max(o["solve_time"], 1e-9)
+        print(f"{r['case']:16} {r['engine']:6} solve {o['solve_time']:8.3f}s → {r['solve_time']:8.3f}s (×{ratio:.2f})"
+              + (f"  РЕГРЕССИЯ: {'; '.join(notes)}" if notes else ""))
+        regressions += bool(notes)
+    return regressions
+
+
+def _check_cache_extend(root: str) -> List[str]:
+    """
+    Сессия досчитывает расширенный диапазон S: после «перезапуска» (новые solver'ы на том же кэше)
+    и прежний, и расширенный диапазоны загружаются из кэша и дают те же ответы, что и расчёт без кэша.
+    """
+    rules = GameRules(**_scaled_24115(10 ** 4))
+    cache = SolutionCache(root)
+
+    def solver(s_min: int, s_max: int, use_cache: bool = True) -> RetroSolver:
+        return RetroSolver(rules, (None,), s_min, s_max, max_depth=TASKS_DEPTH, cache=cache if use_cache else None)
+
+    session = SolverSession(lambda r, t, lo, hi: solver(lo, hi))
+    session.solve_all(rules, (None,), 1, 5000)
+    session.solve_all(rules, (None,), 1, 9000)
+
+    problems = []
+    for lo, hi in ((1, 5000), (1, 9000)):
+        fresh = solver(lo, hi)
+        if not fresh.cached():
+            problems.append(f"S {lo}..{hi} нет в кэше")
+        elif fresh.solve_all() != solver(lo, hi, use_cache=False).solve_all():
+            problems.append(f"S {lo}..{hi}: из кэша другие ответы")
+    return problems
+
+
+CHECKS: Dict[str, Callable[[str], List[str]]] = {
+    "cache-extend": _check_cache_extend,
+}
+
+
+def check(only: Optional[str]) -> int:
+    """Выполнить проверки (каждую — с пустым кэшем во временном каталоге); число проваленных."""
+    failed = 0
+    for name, fn in CHECKS.items():
+        if only and only not in name:
+            continue
+        with tempfile.TemporaryDirectory() as root:
+            problems = fn(root)
+        print(f"{name:16} " + ("ok" if not problems else "ОШИБКА: " + "; ".join(problems)))
+        failed += bool(problems)
+    return failed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарки solver'а задач 19–21")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_run = sub.add_parser("run", help="выполнить замеры")
+    p_run.add_argument("--engine", choices=ENGINES, action="append", help="движок (по умолчанию — все)")
+    p_run.add_argument("--only", help="только конфигурации с подстрокой в имени или с таким тегом")
+    p_run.add_argument("--repeat", type=int, default=1, help="повторов на замер (берётся лучший)")
+    p_run.add_argument("--out", help="куда сохранить JSON")
+    p_cmp = sub.add_parser("compare", help="сравнить два JSON-прогона")
+    p_cmp.add_argument("old")
+    p_cmp.add_argument("new")
+    p_cmp.add_argument("--tolerance", type=float, default=0.25, help="допустимое замедление (доля)")
+    p_chk = sub.add_parser("check", help="проверки поведения")
+    p_chk.add_argument("--only", help="только проверки с подстрокой в имени")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "run":
+        payload = run(args.engine or list(ENGINES), args.only, max(1, args.repeat))
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False, indent=2)
+        return 0
+    if args.cmd == "check":
+        failed = check(args.only)
+        print(f"Провалено: {failed}")
+        return 1 if failed else 0
+    with open(args.old, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    regressions = compare(old, new, args.tolerance)
+    print(f"Регрессий: {regressions}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,7 @@
+from .budget import Budget
 from .rules import GameRules
 from .solver import EGESolver
+from .retro import RetroSolver
+from .tasks import TaskQuery
 
-__all__ = ["GameRules", "EGESolver"]
+__all__ = ["Budget", "GameRules", "EGESolver", "RetroSolver", "TaskQuery"]
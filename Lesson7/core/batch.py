@@ -0,0 +1,149 @@
+"""
+Пакетный расчёт задач 19–21 без интерфейса (PyQt6 не импортируется).
+
+  python -m core.batch jobs.jsonl [--out results.jsonl] [--workers N] [--engine auto|ege|retro]
+                       [--cache DIR | --no-cache] [--seconds T] [--states N] [--max-entries N [--no-spill]]
+
+Каждая строка входа — JSON-объект:
+  {"rules": {...аргументы GameRules...}, "start_template": [7, null], "s_min": 1, "s_max": 100,
+   "id": "необязательная метка", "budget": {"seconds": 10, "states": 1000000}}
+Каждая строка выхода — как «Экспорт JSON» в интерфейсе: {"meta": {...}, "results": {"task19": [...], ...}}.
+Строки выходят по мере готовности; meta.line — номер строки входа (с 1), meta.status — итог расчёта
+(done / budget_exceeded / error). Код возврата 1, если хоть одна строка завершилась ошибкой.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from .budget import Budget
+from .cache import SolutionCache, default_cache_dir, normalized_rules
+from .memo import CachePolicy
+from .retro import TASKS_DEPTH, RetroSolver
+from .rules import GameRules
+from .solver import EGESolver
+from .states import np
+
+ENGINES = ("auto", "ege", "retro")
+# Заданий в очереди пула на процесс: больше — меньше простоев, но дольше отмена по Ctrl+C
+QUEUE_PER_WORKER = 2
+
+
+def make_solver(rules: GameRules, start_template: Tuple[Optional[int], ...], s_min: int, s_max: int,
+                engine: str = "auto", cache_dir: Optional[str] = None,
+                budget: Optional[Budget] = None, cache_policy: Optional[CachePolicy] = None) -> EGESolver:
+    """Как в интерфейсе: табличный движок (с дисковым кэшем, если задан cache_dir), без numpy — перебор."""
+    if engine == "ege" or (engine == "auto" and np is None):
+        return EGESolver(rules, start_template, s_min, s_max, budget=budget, cache_policy=cache_policy)
+    cache = SolutionCache(cache_dir) if cache_dir else None
+    return RetroSolver(rules, start_template, s_min, s_max, max_depth=TASKS_DEPTH, cache=cache, budget=budget,
+                       cache_policy=cache_policy)
+
+
+def solve_job(line: int, job: Dict[str, Any], engine: str, cache_dir: Optional[str],
+              budget: Optional[Budget], cache_policy: Optional[CachePolicy] = None) -> Dict[str, Any]:
+    """Одна строка входа -> одна строка выхода (ошибки не выбрасываются, а попадают в meta.error)."""
+    meta: Dict[str, Any] = dict(line=line, id=job.get("id"))
+    results = dict(task19=[], task20=[], task21=[])
+    try:
+        rules = GameRules(**job["rules"])
+        start_template = tuple(job["start_template"])
+        s_min, s_max = int(job["s_min"]), int(job["s_max"])
+        if "budget" in job:
+            budget = Budget(**job["budget"])
+        meta.update(rules=normalized_rules(rules), start_template=list(start_template),
+                    s_min=min(s_min, s_max), s_max=max(s_min, s_max), workers=1)
+        solver = make_solver(rules, start_template, s_min, s_max, engine, cache_dir, budget, cache_policy)
+        t0 = time.perf_counter()
+        s19, s20, s21 = solver.solve_all()
+        meta.update(elapsed=time.perf_counter() - t0, engine=type(solver).__name__, status=solver.status,
+                    cancelled=False, stats=solver.stats_report())
+        results = dict(task19=s19, task20=s20, task21=s21)
+    except Exception as e:  # битая строка не должна останавливать ночной прогон
+        meta.update(status="error", error=f"{type(e).__name__}: {e}")
+    return dict(meta=meta, results=results)
+
+
+def read_jobs(f: TextIO) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """(номер строки, задание) для непустых строк; некорректный JSON — задание с ошибкой разбора."""
+    for line, text in enumerate(f, start=1):
+        text = text.strip()
+        if not text or text.startswith("#"):
+            continue
+        try:
+            job = json.loads(text)
+        except json.JSONDecodeError as e:
+            job = dict(_error=f"JSONDecodeError: {e}")
+        yield line, job
+
+
+def run(jobs: Iterator[Tuple[int, Dict[str, Any]]], out: TextIO, workers: int, engine: str,
+        cache_dir: Optional[str], budget: Optional[Budget], cache_policy: Optional[CachePolicy] = None) -> int:
+    """Решить задания в пуле процессов, записывая строки выхода по мере готовности; число ошибок."""
+    errors = 0
+
+    def emit(record: Dict[str, Any]) -> None:
+        nonlocal errors
+        errors += record["meta"].get("status") == "error"
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+
+    ctx = mp.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        pending = set()
+        for line, job in jobs:
+            if "_error" in job:
+                emit(dict(meta=dict(line=line, id=None, status="error", error=job["_error"]),
+                          results=dict(task19=[], task20=[], task21=[])))
+                continue
+            pending.add(pool.submit(solve_job, line, job, engine, cache_dir, budget, cache_policy))
+            if len(pending) >= workers * QUEUE_PER_WORKER:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    emit(fut.result())
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                emit(fut.result())
+    return errors
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m core.batch", description="Пакетный расчёт задач 19–21 из JSONL")
+    parser.add_argument("jobs", help="JSONL с заданиями ('-' — стандартный ввод)")
+    parser.add_argument("--out", help="куда писать JSONL с результатами (по умолчанию — стандартный вывод)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="процессов в пуле")
+    parser.add_argument("--engine", choices=ENGINES, default="auto",
+                        help="auto — табличный движок, если есть numpy")
+    parser.add_argument("--cache", default=None, help=f"каталог дискового кэша (по умолчанию {default_cache_dir()})")
+    parser.add_argument("--no-cache", action="store_true", help="не использовать дисковый кэш")
+    parser.add_argument("--seconds", type=float, help="бюджет времени на задание")
+    parser.add_argument("--states", type=int, help="бюджет позиций на задание")
+    parser.add_argument("--max-entries", type=int, help="предел записей в каждом кэше solver'а (см. CachePolicy)")
+    parser.add_argument("--no-spill", action="store_true", help="вытесненное из кэшей забывать, а не упаковывать")
+    args = parser.parse_args(argv)
+
+    cache_dir = None if args.no_cache or np is None else (args.cache or default_cache_dir())
+    budget = None
+    if args.seconds is not None or args.states is not None:
+        budget = Budget(seconds=args.seconds, states=args.states)
+    cache_policy = CachePolicy(args.max_entries, spill=not args.no_spill)
+    src = sys.stdin if args.jobs == "-" else open(args.jobs, encoding="utf-8")
+    out = sys.stdout if not args.out else open(args.out, "w", encoding="utf-8")
+    try:
+        errors = run(read_jobs(src), out, max(1, args.workers), args.engine, cache_dir, budget, cache_policy)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if out is not sys.stdout:
+            out.close()
+    print(f"Ошибок: {errors}", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
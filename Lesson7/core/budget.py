@@ -0,0 +1,43 @@
+import time
+from dataclasses import dataclass, replace
+from typing import Optional
+
+# Итог последнего расчёта solver'а (EGESolver.status)
+DONE = "done"
+CANCELLED = "cancelled"
+BUDGET_EXCEEDED = "budget_exceeded"
+
+# Через сколько новых позиций/промахов кэшей внутри перебора опрашивать отмену и бюджет
+CHECK_EVERY = 1024
+
+
+class BudgetExceeded(RuntimeError):
+    """Бюджет расчёта исчерпан; solver ловит его сам и возвращает частичный результат."""
+
+
+@dataclass(frozen=True)
+class Budget:
+    """
+    Ограничения одного расчёта (solve_all / start_outcomes); None — без ограничения.
+    - seconds: время по часам
+    - states: сколько новых позиций может сгенерировать solver (в параллельном расчёте — каждый процесс)
+    - deadline: момент time.time(), до которого можно считать; проставляется при запуске
+      расчёта (started), поэтому шарды в других процессах делят общий срок
+    """
+    seconds: Optional[float] = None
+    states: Optional[int] = None
+    deadline: Optional[float] = None
+
+    def __post_init__(self):
+        if self.seconds is not None and self.seconds < 0:
+            raise ValueError("seconds должен быть неотрицательным")
+        if self.states is not None and self.states < 0:
+            raise ValueError("states должен быть неотрицательным")
+
+    def started(self) -> "Budget":
+        if self.seconds is None or self.deadline is not None:
+            return self
+        return replace(self, deadline=time.time() + self.seconds)
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.time() >= self.deadline
@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+from .rules import GameRules
+from .states import np, require_numpy
+
+# Версия формата файла; записи другой версии считаются отсутствующими и удаляются
+CACHE_VERSION = 3
+MAGIC = b"EGEC"
+SUFFIX = ".egec"
+# Выравнивание массивов в файле (байт) — чтобы memmap-представления были выровнены
+ALIGN = 64
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def default_cache_dir() -> str:
+    return os.environ.get("EGE_SOLVER_CACHE") or os.path.join(os.path.expanduser("~"), ".cache", "ege-solver")
+
+
+def normalized_rules(rules: GameRules) -> Dict[str, Any]:
+    """Правила в каноническом виде: одинаковые по смыслу правила дают одинаковый словарь."""
+    return dict(
+        heaps=rules.heaps,
+        target_mode=rules.target_mode,
+        target=rules.target,
+        finish_cmp=rules.finish_cmp,
+        heap_index=rules.heap_index if rules.target_mode == "heap" else None,
+        adds=sorted(set(rules.adds)),
+        mults=sorted(set(rules.mults)),
+        divs=sorted(set(rules.divs)),
+    )
+
+
+def cache_key(rules: GameRules, start_template: Tuple[Optional[int], ...], max_depth: Optional[int]) -> str:
+    """Адрес записи: хэш нормализованных правил, шаблона старта и глубины перечисления."""
+    payload = dict(version=CACHE_VERSION, rules=normalized_rules(rules),
+                   start_template=list(start_template), max_depth=max_depth)
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _data_start(header_len: int) -> int:
+    return -(-(len(MAGIC) + 4 + header_len) // ALIGN) * ALIGN
+
+
+class CacheEntry:
+    """
+    Загруженная запись: метаданные и массивы (только для чтения, отображены в память).
+    - s_min, s_max: диапазон S, из стартов которого строился граф (подходит и для любого поддиапазона)
+    """
+
+    def __init__(self, meta: Dict[str, Any], arrays: Dict[str, "np.ndarray"]):
+        self.meta = meta
+        self.arrays = arrays
+
+    @property
+    def s_min(self) -> int:
+        return self.meta["s_min"]
+
+    @property
+    def s_max(self) -> int:
+        return self.meta["s_max"]
+
+    def covers(self, s_min: int, s_max: int) -> bool:
+        return self.s_min <= s_min and s_max <= self.s_max
+
+
+class SolutionCache:
+    """
+    Кэш решённых таблиц на диске: один файл на запись, имя файла — cache_key.
+    Формат файла: MAGIC, длина заголовка (uint32 LE), заголовок JSON (версия, метаданные,
+    таблица массивов: имя, dtype, форма, смещение от начала данных), затем сырые массивы
+    с выравниванием ALIGN.
+    Массивы открываются через np.memmap, поэтому загрузка не читает файл целиком.
+    Суммарный размер ограничен max_bytes: при записи вытесняются давно не использованные записи.
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        require_numpy()
+        self.root = root or default_cache_dir()
+        self.max_bytes = max_bytes
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key + SUFFIX)
+
+    # ---------- Чтение ----------
+    def load(self, key: str) -> Optional[CacheEntry]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    raise ValueError("bad magic")
+                (header_len,) = struct.unpack("<I", f.read(4))
+                header = json.loads(f.read(header_len).decode("utf-8"))
+            base = _data_start(header_len)
+            if header.get("version") != CACHE_VERSION or header.get("key") != key:
+                raise ValueError("stale entry")
+            arrays = {}
+            for spec in header["arrays"]:
+                shape = tuple(spec["shape"])
+                dtype = np.dtype(spec["dtype"])
+                if int(np.prod(shape)) == 0:
+                    arrays[spec["name"]] = np.empty(shape, dtype=dtype)
+                else:
+                    arrays[spec["name"]] = np.memmap(path, dtype=dtype, mode="r",
+                                                     offset=base + spec["offset"], shape=shape)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError, struct.error):
+            self._remove(path)  # битая или устаревшая запись
+            return None
+        try:
+            os.utime(path)  # отметка использования для вытеснения
+        except OSError:
+            pass
+        return CacheEntry(header["meta"], arrays)
+
+    # ---------- Запись ----------
+    def store(self, key: str, meta: Dict[str, Any], arrays: Dict[str, "np.ndarray"]) -> bool:
+        """Записать массивы атомарно (через временный файл). False — запись больше max_bytes и не сохранена."""
+        specs = []
+        offset = 0
+        for name, arr in arrays.items():
+            arr = np.ascontiguousarray(arr)
+            offset = -(-offset // ALIGN) * ALIGN
+            specs.append(dict(name=name, dtype=arr.dtype.str, shape=list(arr.shape), offset=offset))
+            offset += arr.nbytes
+
+        header = json.dumps(dict(version=CACHE_VERSION, key=key, meta=meta, arrays=specs)).encode("utf-8")
+        base = _data_start(len(header))
+        total = base + offset
+        if total > self.max_bytes:
+            return False
+        os.makedirs(self.root, exist_ok=True)
+        self._evict(self.max_bytes - total, keep=key)
+
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(MAGIC)
+                f.write(struct.pack("<I", len(header)))
+                f.write(header)
+                for spec, arr in zip(specs, arrays.values()):
+                    f.write(b"\0" * (base + spec["offset"] - f.tell()))
+                    f.write(np.ascontiguousarray(arr).tobytes())
+            os.replace(tmp, path)
+        except OSError:
+            self._remove(tmp)
+            return False
+        return True
+
+    # ---------- Обслуживание ----------
+    def entries(self) -> List[Tuple[str, int, float]]:
+        """(путь, размер, время последнего использования) для всех записей."""
+        res = []
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return res
+        for name in names:
+            if not name.endswith(SUFFIX):
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            res.append((path, st.st_size, st.st_mtime))
+        return res
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def _evict(self, budget: int, keep: Optional[str] = None) -> None:
+        """Удалять самые давно использованные записи, пока остальные не уложатся в budget байт."""
+        keep_path = self._path(keep) if keep else None
+        entries = [e for e in self.entries() if e[0] != keep_path]
+        used = sum(size for _, size, _ in entries)
+        for path, size, _ in sorted(entries, key=lambda e: e[2]):
+            if used <= budget:
+                break
+            if self._remove(path):
+                used -= size
+
+    def clear(self) -> None:
+        for path, _, _ in self.entries():
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError:  # например, файл ещё отображён в память в другом процессе (Windows)
+            return False
@@ -0,0 +1,103 @@
+from typing import Callable, List, Tuple
+
+from .actions import Action
+from .rules import GameRules
+
+try:
+    import numpy as np
+except ImportError:  # векторные функции нужны только табличным движкам
+    np = None
+
+
+class CompiledRules:
+    """
+    GameRules, один раз разобранные в готовые функции — без сравнения строк на каждом вызове.
+    Скалярные (для перебора по кортежам):
+      - is_terminal(state) -> bool
+      - steps[j](x) -> новое значение кучи после actions[j]
+    Векторные (numpy, для построения графа целыми слоями):
+      - apply_all(col) -> [K, m]: все K действий к массиву значений кучи сразу
+      - successors(states) -> [heaps * K, m, heaps]: все ходы для массива позиций [m, heaps]
+      - terminal_mask(cols) -> bool [...]: терминальность по столбцам значений куч
+    Порядок действий и ходов — как в Game.iter_moves: куча за кучей, внутри — adds, mults, divs.
+    """
+
+    def __init__(self, rules: GameRules):
+        self.rules = rules
+        self.actions: Tuple[Action, ...] = tuple(
+            [Action("add", a) for a in rules.adds] +
+            [Action("mul", m) for m in rules.mults] +
+            [Action("div", d) for d in rules.divs]
+        )
+        self.steps: Tuple[Callable[[int], int], ...] = tuple(_scalar_step(act) for act in self.actions)
+        self.is_terminal: Callable[[Tuple[int, ...]], bool] = _scalar_terminal(rules)
+        if np is not None:
+            self._adds = np.array(rules.adds, dtype=np.int64)[:, None]
+            self._mults = np.array(rules.mults, dtype=np.int64)[:, None]
+            self._divs = np.array(rules.divs, dtype=np.int64)[:, None]
+
+    # ---------- Векторные функции ----------
+    def apply_all(self, col: "np.ndarray") -> "np.ndarray":
+        """Значения кучи после каждого действия: по одной операции numpy на вид действия."""
+        col = np.asarray(col, dtype=np.int64)[None, :]
+        parts = []
+        if len(self._adds):
+            parts.append(col + self._adds)
+        if len(self._mults):
+            parts.append(col * self._mults)
+        if len(self._divs):
+            parts.append(np.floor_divide(col, self._divs))
+        if not parts:
+            return np.empty((0, col.shape[1]), dtype=np.int64)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def successors(self, states: "np.ndarray") -> "np.ndarray":
+        """Кандидаты в ходы для позиций states [m, heaps] (повторы и state_guard не отсеиваются)."""
+        m, heaps = states.shape
+        k = len(self.actions)
+        cand = np.empty((heaps, k, m, heaps), dtype=np.int64)
+        cand[...] = states
+        for i in range(heaps):
+            cand[i, :, :, i] = self.apply_all(states[:, i])
+        return cand.reshape(heaps * k, m, heaps)
+
+    def terminal_mask(self, cols: List["np.ndarray"]) -> "np.ndarray":
+        rules = self.rules
+        if rules.target_mode == "heap":
+            val = cols[rules.heap_index]
+        elif len(cols) == 1:
+            val = cols[0]
+        else:
+            reduce = np.add if rules.target_mode == "sum" else np.maximum
+            val = reduce(cols[0], cols[1])
+            for col in cols[2:]:
+                reduce(val, col, out=val)
+        return val >= rules.target if rules.finish_cmp == "ge" else val < rules.target
+
+
+def _scalar_step(act: Action) -> Callable[[int], int]:
+    arg = act.arg
+    if act.kind == "add":
+        return lambda x: x + arg
+    elif act.kind == "mul":
+        return lambda x: x * arg
+    elif act.kind == "div":
+        return lambda x: x // arg
+    raise ValueError(f"Unknown action kind: {act.kind}")
+
+
+def _scalar_terminal(rules: GameRules) -> Callable[[Tuple[int, ...]], bool]:
+    target = rules.target
+    if rules.finish_cmp not in ("ge", "lt"):
+        raise ValueError(f"Unknown finish_cmp: {rules.finish_cmp}")
+    ge = rules.finish_cmp == "ge"
+    # Сравнение подставлено прямо в лямбду: operator.ge и т.п. — лишний вызов на каждую проверку
+    if rules.target_mode == "sum":
+        return (lambda state: sum(state) >= target) if ge else (lambda state: sum(state) < target)
+    elif rules.target_mode == "max":
+        return (lambda state: max(state) >= target) if ge else (lambda state: max(state) < target)
+    elif rules.target_mode == "heap":
+        idx = rules.heap_index  # валидируется в GameRules.__post_init__
+        assert idx is not None
+        return (lambda state: state[idx] >= target) if ge else (lambda state: state[idx] < target)
+    raise ValueError(f"Unknown target_mode: {rules.target_mode}")
@@ -1,7 +1,10 @@
+import time
 from typing import Callable, Iterable, Tuple, Optional, Set
 
 from .actions import Action
+from .compiled import CompiledRules
 from .rules import GameRules
+from .stats import SolverStats
 
 
 class Game:
@@ -9,35 +12,43 @@ class Game:
     Инкапсулирует правила и операции:
     - проверка терминала;
     - генерация ходов из состояния (меняется ровно одна куча);
-    - описание хода.
+    - описание хода;
+    - симметрия: в режимах 'sum'/'max' позиции, отличающиеся порядком куч, равносильны.
+    Если задан stats (SolverStats), считаются сгенерированные позиции и проверки терминала.
+    Проверка терминала и действия берутся из CompiledRules — правила разбираются один раз.
     """
 
     def __init__(self, rules: GameRules,
                  state_guard: Optional[Callable[[Tuple[int, ...]], bool]] = None):
         self.rules = rules
         self.state_guard = state_guard
-        self.actions: Tuple[Action, ...] = tuple(
-            [Action("add", a) for a in self.rules.adds] +
-            [Action("mul", m) for m in self.rules.mults] +
-            [Action("div", d) for d in self.rules.divs]
-        )
+        self.compiled = CompiledRules(rules)
+        self.actions: Tuple[Action, ...] = self.compiled.actions
+        self._steps = self.compiled.steps
+        self._is_terminal = self.compiled.is_terminal
+        # state_guard может различать порядок куч — тогда симметрией не пользуемся
+        self.symmetric = (self.rules.heaps >= 2 and self.rules.target_mode in ("sum", "max")
+                          and state_guard is None)
+        self.stats: Optional[SolverStats] = None
 
-    def is_terminal(self, state: Tuple[int, ...]) -> bool:
-        if self.rules.target_mode == "sum":
-            val = sum(state)
-        elif self.rules.target_mode == "max":
-            val = max(state)
-        elif self.rules.target_mode == "heap":
-            idx = self.rules.heap_index  # валидируется в GameRules.__post_init__
-            assert idx is not None
-            val = state[idx]
-        else:
-            raise ValueError(f"Unknown target_mode: {self.rules.target_mode}")
+    def canonical(self, state: Tuple[int, ...]) -> Tuple[int, ...]:
+        """Представитель класса равносильных позиций (для симметричных правил — кучи по возрастанию)."""
+        if not self.symmetric:
+            return state
+        if len(state) == 2:
+            return state if state[0] <= state[1] else (state[1], state[0])
+        return tuple(sorted(state))
 
-        if self.rules.finish_cmp == "ge":
-            return val >= self.rules.target
-        else:  # "lt"
-            return val < self.rules.target
+    def is_terminal(self, state: Tuple[int, ...]) -> bool:
+        stats = self.stats
+        if stats is not None:
+            stats.terminal_checks += 1
+            if stats.timed:
+                t0 = time.perf_counter()
+                res = self._is_terminal(state)
+                stats.add_time("terminal", time.perf_counter() - t0)
+                return res
+        return self._is_terminal(state)
 
     def iter_moves(self, state: Tuple[int, ...]) -> Iterable[Tuple[int, ...]]:
         """Итерирует все позиции, достижимые за 1 ход (меняется ровно одна куча)."""
@@ -45,15 +56,16 @@ class Game:
         seen: Set[Tuple[int, ...]] = set()
         for i in range(n):
             old = state[i]
-            for act in self.actions:
-                new_state = list(state)
-                new_state[i] = act.apply(old)
-                t = tuple(new_state)
+            head, tail = state[:i], state[i + 1:]
+            for step in self._steps:
+                t = head + (step(old),) + tail
                 if t in seen:
                     continue
                 if self.state_guard and not self.state_guard(t):
                     continue
                 seen.add(t)
+                if self.stats is not None:
+                    self.stats.states_generated += 1
                 yield t
 
     def describe_move(self, a: Tuple[int, ...], b: Tuple[int, ...]) -> str:
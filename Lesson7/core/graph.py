@@ -0,0 +1,263 @@
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from .game import Game
+from .rules import GameRules
+from .states import StateIndex, np, require_numpy
+
+# Во сколько раз прямоугольник ключей может превышать max_states при полном перечислении
+BOX_SLACK = 16
+# До какого размера прямоугольника ключей используется плотная таблица key -> node
+DENSE_KEYS_LIMIT = 16_000_000
+
+
+def _sorted_columns(cols: List["np.ndarray"]) -> List["np.ndarray"]:
+    """Канонический вид для симметричных правил: значения куч по возрастанию в каждой позиции."""
+    if len(cols) == 2:
+        return [np.minimum(cols[0], cols[1]), np.maximum(cols[0], cols[1])]
+    return list(np.sort(np.stack([np.asarray(c, dtype=np.int64) for c in cols]), axis=0))
+
+
+class _KeyMap:
+    """
+    Отображение ключ позиции (индекс в StateIndex) -> номер вершины графа.
+    Разреженный вариант — несколько отсортированных серий ключей, как в двоичном счётчике:
+    новая серия сливается с предыдущими, пока те не больше её вдвое. Серий O(log n),
+    и каждый ключ переливается O(log n) раз — построение по слоям не становится квадратичным.
+    """
+
+    def __init__(self, key_space: int):
+        self.dense = key_space <= DENSE_KEYS_LIMIT
+        if self.dense:
+            self.table = np.full(key_space, -1, dtype=np.int32)
+        else:  # серии (отсортированные ключи, номера), от больших к меньшим
+            self.runs: List[Tuple["np.ndarray", "np.ndarray"]] = []
+
+    def get(self, keys: "np.ndarray") -> "np.ndarray":
+        if self.dense:
+            return self.table[keys]
+        res = np.full(len(keys), -1, dtype=np.int32)
+        for run_keys, run_ids in self.runs:
+            pos = np.minimum(np.searchsorted(run_keys, keys), len(run_keys) - 1)
+            hit = run_keys[pos] == keys
+            res[hit] = run_ids[pos[hit]]
+        return res
+
+    def add(self, keys: "np.ndarray", ids: "np.ndarray") -> None:
+        if self.dense:
+            self.table[keys] = ids
+            return
+        if not len(keys):
+            return
+        order = np.argsort(keys, kind="stable")
+        run = (keys[order], ids[order].astype(np.int32))
+        while self.runs and len(self.runs[-1][0]) <= 2 * len(run[0]):
+            prev_keys, prev_ids = self.runs.pop()
+            merged = np.concatenate([prev_keys, run[0]])
+            order = np.argsort(merged, kind="stable")  # слияние двух отсортированных серий — линейно
+            run = (merged[order], np.concatenate([prev_ids, run[1]])[order])
+        self.runs.append(run)
+
+
+class MoveGraph:
+    """
+    Граф ходов достижимой области в формате CSR.
+    - states[v]: значения куч вершины v (int64 [n, heaps])
+    - offsets/targets: ходы вершины v — targets[offsets[v]:offsets[v + 1]]
+      (в том же порядке, что и Game.iter_moves, без повторов)
+    - terminal[v]: вершина терминальна (заменяет Game.is_terminal)
+    - expanded[v]: ходы вершины построены (старты — всегда, остальные — если нетерминальны и в пределах глубины)
+    - depth[v]: кратчайшая глубина от стартов в полуходах
+    - symmetric: позиции хранятся только в каноническом виде (Game.canonical): перестановки куч —
+      одна вершина; ходы ведут в канонические позиции, поэтому moves() для такого графа недоступен
+    """
+
+    def __init__(self, rules: GameRules, index: StateIndex, states: "np.ndarray", offsets: "np.ndarray",
+                 targets: "np.ndarray", terminal: "np.ndarray", expanded: "np.ndarray", depth: "np.ndarray",
+                 keys: _KeyMap, symmetric: bool = False):
+        self.rules = rules
+        self.index = index
+        self.states = states
+        self.offsets = offsets
+        self.targets = targets
+        self.terminal = terminal
+        self.expanded = expanded
+        self.depth = depth
+        self._keys = keys
+        self.symmetric = symmetric
+
+    @property
+    def size(self) -> int:
+        return len(self.states)
+
+    @property
+    def edges(self) -> int:
+        return len(self.targets)
+
+    def degree(self) -> "np.ndarray":
+        return np.diff(self.offsets)
+
+    def edge_sources(self) -> "np.ndarray":
+        return np.repeat(np.arange(self.size, dtype=np.int32), self.degree())
+
+    # ---------- Поиск вершин ----------
+    def nodes(self, cols: List["np.ndarray"]) -> "np.ndarray":
+        """Номера вершин для массивов значений куч (-1 — позиция не в графе)."""
+        if self.symmetric:
+            cols = _sorted_columns(cols)
+        keys = self.index.encode_columns(cols)
+        res = np.full(keys.shape, -1, dtype=np.int32)
+        inside = keys >= 0
+        res[inside] = self._keys.get(keys[inside])
+        return res
+
+    def node(self, state: Tuple[int, ...]) -> int:
+        if self.symmetric:
+            state = tuple(sorted(state))
+        key = self.index.encode(state)
+        if key < 0:
+            return -1
+        return int(self._keys.get(np.array([key], dtype=np.int64))[0])
+
+    def state(self, v: int) -> Tuple[int, ...]:
+        return tuple(int(x) for x in self.states[v])
+
+    def successors(self, v: int) -> "np.ndarray":
+        return self.targets[self.offsets[v]:self.offsets[v + 1]]
+
+    def moves(self, state: Tuple[int, ...]) -> Optional[Tuple[Tuple[int, ...], ...]]:
+        """Ходы из позиции или None, если позиция не раскрыта в графе (или граф симметричный)."""
+        if self.symmetric:
+            return None
+        v = self.node(state)
+        if v < 0 or not self.expanded[v]:
+            return None
+        return tuple(self.state(int(u)) for u in self.successors(v))
+
+    def is_terminal(self, state: Tuple[int, ...]) -> Optional[bool]:
+        v = self.node(state)
+        return None if v < 0 else bool(self.terminal[v])
+
+    # ---------- Построение ----------
+    @classmethod
+    def from_arrays(cls, rules: GameRules, index: StateIndex, states: "np.ndarray", offsets: "np.ndarray",
+                    targets: "np.ndarray", terminal: "np.ndarray", expanded: "np.ndarray",
+                    depth: "np.ndarray", symmetric: bool = False) -> "MoveGraph":
+        """Граф из готовых массивов (например, загруженных из кэша); восстанавливается только key -> node."""
+        require_numpy()
+        keymap = _KeyMap(index.size)
+        keys = index.encode_columns([states[:, i] for i in range(index.heaps)])
+        keymap.add(keys, np.arange(len(states), dtype=np.int32))
+        return cls(rules, index, states, offsets, targets, terminal, expanded, depth, keymap, symmetric)
+
+    @classmethod
+    def build(cls, game: Game, starts: Iterable[Tuple[int, ...]], max_depth: Optional[int] = None,
+              max_states: int = 50_000_000, cancel_cb: Optional[Callable[[], bool]] = None) -> "MoveGraph":
+        """
+        Послойный BFS от стартов: на каждом слое все действия применяются к целому массиву
+        значений кучи сразу, новые позиции получают номера в порядке обнаружения.
+        При симметричных правилах (game.symmetric) все позиции приводятся к каноническому виду.
+        cancel_cb (отмена и бюджет solver'а) опрашивается на каждом шаге роста прямоугольника и на каждом слое.
+        """
+        require_numpy()
+        rules = game.rules
+        starts = list(starts)
+        if not starts:
+            raise ValueError("Нет стартовых позиций")
+        index = StateIndex.for_region(
+            game, starts, max_depth, None if max_depth is not None else max_states * BOX_SLACK, cancel_cb
+        )
+        symmetric = game.symmetric
+        if symmetric:  # канонические позиции лежат в объединении прямоугольника и его перестановок
+            index = StateIndex((min(index.lo),) * index.heaps, (max(index.hi),) * index.heaps)
+        keymap = _KeyMap(index.size)
+        heaps = index.heaps
+
+        start_cols = [np.array([st[i] for st in starts], dtype=np.int64) for i in range(heaps)]
+        if symmetric:
+            start_cols = _sorted_columns(start_cols)
+        start_keys = index.encode_columns(start_cols)
+        _, first = np.unique(start_keys, return_index=True)
+        first.sort()
+        frontier_keys = start_keys[first]
+        keymap.add(frontier_keys, np.arange(len(first), dtype=np.int32))
+
+        state_chunks = [np.stack([c[first] for c in start_cols], axis=1)]
+        depth_chunks = [np.zeros(len(first), dtype=np.int32)]
+        compiled = game.compiled
+        term_chunks = [compiled.terminal_mask([c[first] for c in start_cols])]
+        edge_src: List["np.ndarray"] = []
+        edge_dst: List["np.ndarray"] = []
+        expanded_ids: List["np.ndarray"] = []
+        n_nodes = len(first)
+
+        frontier = np.arange(n_nodes, dtype=np.int32)
+        frontier_states = state_chunks[0]
+        frontier_term = term_chunks[0]
+        d = 0
+        while frontier.size and (max_depth is None or d < max_depth):
+            if cancel_cb and cancel_cb():
+                raise RuntimeError("CANCELLED")
+            if d > 0:  # старты раскрываются всегда, остальные — только нетерминальные
+                keep = ~frontier_term
+                frontier, frontier_states = frontier[keep], frontier_states[keep]
+            if not frontier.size:
+                break
+            expanded_ids.append(frontier)
+
+            # Кандидаты: [куча × действие, вершина] — порядок как в Game.iter_moves
+            if not game.actions:
+                break
+            cand = compiled.successors(frontier_states)  # [K, m, heaps]
+            if symmetric:
+                cand.sort(axis=2)
+            keys = index.encode_columns([cand[:, :, i] for i in range(heaps)])
+            if (keys < 0).any():
+                raise AssertionError("Ход вышел за пределы рассчитанной области")
+            valid = np.ones(keys.shape, dtype=bool)
+            for k in range(1, len(keys)):
+                for j in range(k):
+                    valid[k] &= keys[k] != keys[j]
+            if game.state_guard is not None:
+                guard = np.fromiter((game.state_guard(tuple(int(x) for x in st)) for st in cand.reshape(-1, heaps)),
+                                    dtype=bool, count=keys.size).reshape(keys.shape)
+                valid &= guard
+
+            ids = np.full(keys.shape, -1, dtype=np.int32)
+            ids[valid] = keymap.get(keys[valid])
+            new_mask = valid & (ids < 0)
+            new_keys, new_first = np.unique(keys[new_mask], return_index=True)
+            if new_keys.size:
+                new_ids = np.arange(n_nodes, n_nodes + len(new_keys), dtype=np.int32)
+                keymap.add(new_keys, new_ids)
+                if n_nodes + len(new_keys) > max_states:
+                    raise ValueError(
+                        f"Достижимое множество позиций больше {max_states} — задайте max_depth"
+                    )
+                new_states = cand[new_mask][new_first]
+                state_chunks.append(new_states)
+                depth_chunks.append(np.full(len(new_keys), d + 1, dtype=np.int32))
+                new_term = compiled.terminal_mask([new_states[:, i] for i in range(heaps)])
+                term_chunks.append(new_term)
+                ids[new_mask] = keymap.get(keys[new_mask])
+                n_nodes += len(new_keys)
+                frontier, frontier_states, frontier_term = new_ids, new_states, new_term
+            else:
+                frontier = np.empty(0, dtype=np.int32)
+
+            # Рёбра: по вершинам подряд, внутри вершины — в порядке действий
+            src = np.broadcast_to(expanded_ids[-1], keys.shape).T
+            edge_src.append(src[valid.T])
+            edge_dst.append(ids.T[valid.T])
+            d += 1
+
+        states = np.concatenate(state_chunks)
+        expanded = np.zeros(n_nodes, dtype=bool)
+        if expanded_ids:
+            expanded[np.concatenate(expanded_ids)] = True
+        src = np.concatenate(edge_src) if edge_src else np.empty(0, dtype=np.int32)
+        dst = np.concatenate(edge_dst) if edge_dst else np.empty(0, dtype=np.int32)
+        order = np.argsort(src, kind="stable")
+        offsets = np.zeros(n_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n_nodes), out=offsets[1:])
+        return cls(rules, index, states, offsets, dst[order].astype(np.int32),
+                   np.concatenate(term_chunks), expanded, np.concatenate(depth_chunks), keymap, symmetric)
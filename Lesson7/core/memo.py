@@ -0,0 +1,172 @@
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Ключи упакованных таблиц — int64 (array 'q'); прямоугольник больше — ключи хранятся списком int
+_MAX_CODE = 2 ** 63
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    """
+    Ограничение памяти кэшей EGESolver.
+    - max_entries: сколько записей каждый кэш держит в словаре (None — без ограничения).
+      При переполнении словарь становится «старым поколением», а новые записи идут в пустой;
+      из старого поколения нужные записи переносятся обратно при обращении, остальные
+      забываются при следующей смене поколения — и пересчитываются, если понадобятся снова.
+    - spill: вытесняемые записи кэшей «выигрыш за k ходов» и «ход в терминал» (значения — bool)
+      не забываются, а упаковываются в BitStore: ~8 байт и 1 бит на запись вместо сотен байт в dict.
+    Меньше max_entries — меньше памяти и больше пересчёта; spill=False — ещё меньше памяти, ещё больше пересчёта.
+    """
+    max_entries: Optional[int] = None
+    spill: bool = True
+
+    def __post_init__(self):
+        if self.max_entries is not None and self.max_entries < 1:
+            raise ValueError("max_entries должен быть положительным")
+
+    @property
+    def bounded(self) -> bool:
+        return self.max_entries is not None
+
+
+class _Segment:
+    """Неизменяемый кусок BitStore: коды ключей по возрастанию и биты значений в том же порядке."""
+
+    def __init__(self, items: Dict[Tuple[int, ...], bool]):
+        width = len(next(iter(items)))
+        self.lo = tuple(min(k[i] for k in items) for i in range(width))
+        hi = tuple(max(k[i] for k in items) for i in range(width))
+        strides = [1] * width
+        for i in range(width - 2, -1, -1):
+            strides[i] = strides[i + 1] * (hi[i + 1] - self.lo[i + 1] + 1)
+        self.strides = tuple(strides)
+        self.hi = hi
+        codes = sorted((self._code(k), v) for k, v in items.items())
+        fits = (hi[0] - self.lo[0] + 1) * strides[0] < _MAX_CODE
+        self.codes = array("q", (c for c, _ in codes)) if fits else [c for c, _ in codes]
+        self.bits = bytearray((len(codes) + 7) // 8)
+        for i, (_, v) in enumerate(codes):
+            if v:
+                self.bits[i >> 3] |= 1 << (i & 7)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        item = self.codes.itemsize if isinstance(self.codes, array) else 36
+        return len(self.codes) * item + len(self.bits)
+
+    def _code(self, key: Tuple[int, ...]) -> int:
+        return sum((v - l) * s for v, l, s in zip(key, self.lo, self.strides))
+
+    def get(self, key: Tuple[int, ...]) -> Optional[bool]:
+        for v, l, h in zip(key, self.lo, self.hi):
+            if v < l or v > h:
+                return None
+        code = self._code(key)
+        i = bisect_left(self.codes, code)
+        if i == len(self.codes) or self.codes[i] != code:
+            return None
+        return bool(self.bits[i >> 3] >> (i & 7) & 1)
+
+    def items(self) -> Iterator[Tuple[Tuple[int, ...], bool]]:
+        for i, code in enumerate(self.codes):
+            key = []
+            for l, s in zip(self.lo, self.strides):
+                q, code = divmod(code, s)
+                key.append(l + q)
+            yield tuple(key), bool(self.bits[i >> 3] >> (i & 7) & 1)
+
+
+class BitStore:
+    """
+    Компактное отображение «кортеж целых -> bool» только для чтения и дополнения пачками.
+    Пачка кодируется смешанной системой счисления по своему прямоугольнику ключей и хранится
+    отсортированной; соседние куски сливаются, когда следующий не меньше предыдущего
+    (как в двоичном счётчике), поэтому кусков — O(log n), а поиск — бинарный в каждом.
+    """
+
+    def __init__(self):
+        self._segments: List[_Segment] = []
+
+    def __len__(self) -> int:
+        return sum(len(seg) for seg in self._segments)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(seg.nbytes for seg in self._segments)
+
+    def get(self, key: Tuple[int, ...]) -> Optional[bool]:
+        for seg in reversed(self._segments):  # свежие куски маленькие и чаще нужны
+            res = seg.get(key)
+            if res is not None:
+                return res
+        return None
+
+    def add(self, items: Dict[Tuple[int, ...], bool]) -> None:
+        if not items:
+            return
+        seg = _Segment(items)
+        while self._segments and len(self._segments[-1]) <= len(seg):
+            merged = dict(self._segments.pop().items())
+            merged.update(seg.items())
+            seg = _Segment(merged)
+        self._segments.append(seg)
+
+
+class Memo:
+    """
+    Ограничитель одного dict-кэша по CachePolicy. Сам словарь остаётся у solver'а —
+    попадания по нему не замедляются; Memo нужен только на промахах (recall) и при записи (store).
+    key_fn приводит ключ кэша к кортежу целых для BitStore (None — кэш не упаковывается).
+    on_rotate(размер) получает число записей в памяти (оба поколения) перед сменой поколения —
+    наибольшее за время между сменами.
+    """
+
+    def __init__(self, cache: Dict[Any, Any], policy: CachePolicy, key_fn=None, on_rotate=None):
+        self.cache = cache
+        self.limit = policy.max_entries
+        self.old: Dict[Any, Any] = {}
+        self.bits = BitStore() if policy.spill and key_fn is not None else None
+        self.key_fn = key_fn
+        self.on_rotate = on_rotate
+        self.rotations = 0
+
+    def recall(self, key: Any) -> Any:
+        """Значение из старого поколения или упакованной таблицы (None — нет нигде)."""
+        res = self.old.pop(key, None)
+        if res is not None:
+            self.cache[key] = res
+            return res
+        if self.bits is not None:
+            return self.bits.get(self.key_fn(key))
+        return None
+
+    def store(self, key: Any, value: Any) -> None:
+        cache = self.cache
+        cache[key] = value
+        if self.limit is not None and len(cache) >= self.limit:
+            self.rotations += 1
+            if self.on_rotate is not None:
+                self.on_rotate(len(cache) + len(self.old))
+            if self.bits is not None:
+                packed = {self.key_fn(k): v for k, v in cache.items()}
+                packed.update((self.key_fn(k), v) for k, v in self.old.items())
+                self.bits.add(packed)
+                self.old = {}
+            else:
+                self.old = cache.copy()
+            cache.clear()
+
+    def clear(self) -> None:
+        self.cache.clear()
+        self.old = {}
+        if self.bits is not None:
+            self.bits = BitStore()
+
+    @property
+    def nbytes(self) -> int:
+        return self.bits.nbytes if self.bits is not None else 0
@@ -0,0 +1,139 @@
+import json
+import struct
+import zlib
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+from .cache import normalized_rules
+from .states import np, require_numpy
+from .tasks import DRAW, LOSE, UNKNOWN, WIN
+
+if TYPE_CHECKING:
+    from .retro import RetroSolver
+
+# Клеток карты за один проход: память на проход — несколько массивов такой длины
+CHUNK = 1 << 20
+# Цвета PNG: (R, G, B) для меток; для WIN/LOSE цвет тускнеет с расстоянием до конца партии
+_COLOR_UNKNOWN = (40, 40, 40)
+_COLOR_DRAW = (150, 150, 150)
+_COLOR_FINAL = (60, 60, 150)  # LOSE за 0 ходов — терминальная позиция
+_COLOR_WIN = (40, 220, 70)
+_COLOR_LOSE = (220, 50, 40)
+
+
+def encode_outcomes(solver: "RetroSolver", cols: List["np.ndarray"]) -> "np.ndarray":
+    """
+    Коды исходов для позиций, заданных столбцами значений куч: (расстояние << 2) | метка
+    (метки — core.tasks; позиции вне графа — 0, т.е. UNKNOWN).
+    """
+    v = solver.graph.nodes(cols)
+    res = np.zeros(v.shape, dtype=np.uint32)
+    known = v >= 0
+    nodes = v[known]
+    res[known] = (solver._dist[nodes].astype(np.uint32) << 2) | solver._label[nodes]
+    return res
+
+
+def decode_outcomes(codes: "np.ndarray"):
+    """(метки, расстояния) из кодов encode_outcomes / файла write_outcome_npy."""
+    return (codes & 3).astype(np.uint8), (codes >> 2).astype(np.int32)
+
+
+def write_outcome_npy(solver: "RetroSolver", path: str,
+                      progress_cb: Optional[Callable[[int, int], None]] = None,
+                      cancel_cb: Optional[Callable[[], bool]] = None) -> Dict[str, Any]:
+    """
+    Карта исходов всего прямоугольника позиций solver'а (StateIndex графа) в NPY-файл:
+    массив формы widths (ось i — значения кучи i от index.lo[i]), коды encode_outcomes.
+    Пишется кусками по CHUNK клеток подряд в файл — целиком карта в памяти не собирается.
+    Рядом кладётся path + '.json' с границами, кодировкой и правилами; он же возвращается.
+    """
+    require_numpy()
+    solver.build(cancel_cb)
+    index = solver.graph.index
+    top = (int(solver._dist.max(initial=0)) << 2) | 3
+    dtype = np.uint16 if top < 2 ** 16 else np.uint32
+    header = dict(descr=np.lib.format.dtype_to_descr(np.dtype(dtype)), fortran_order=False, shape=index.widths)
+    with open(path, "wb") as f:
+        np.lib.format.write_array_header_1_0(f, header)
+        for start in range(0, index.size, CHUNK):
+            if cancel_cb and cancel_cb():
+                raise RuntimeError("CANCELLED")
+            stop = min(start + CHUNK, index.size)
+            f.write(encode_outcomes(solver, index.columns(start, stop)).astype(dtype).tobytes())
+            if progress_cb:
+                progress_cb(stop, index.size)
+
+    meta = dict(
+        format="ege-outcome-map", version=1, encoding="code = (dist << 2) | label",
+        labels=dict(unknown=UNKNOWN, win=WIN, lose=LOSE, draw=DRAW),
+        lo=list(index.lo), hi=list(index.hi), dtype=np.dtype(dtype).name,
+        rules=normalized_rules(solver.rules), start_template=list(solver.start_tmpl),
+        s_min=solver.s_min, s_max=solver.s_max, max_depth=solver.max_depth,
+    )
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return meta
+
+
+def outcome_heatmap(solver: "RetroSolver", max_side: int = 1024) -> "np.ndarray":
+    """
+    RGB-картинка [высота, ширина, 3] карты исходов 1- или 2-кучевой игры, уменьшенная до max_side
+    клеток по каждой оси: клетка картинки — блок позиций, в ней исход позиции блока с наименьшим
+    расстоянием (так не пропадают узкие полосы). Строки — куча 1, столбцы — куча 2;
+    у одной кучи — полоса высотой в 1/16 ширины. Считается по вершинам графа, а не по всему
+    прямоугольнику, поэтому время и память не зависят от его площади.
+    """
+    require_numpy()
+    solver.build()
+    g = solver.graph
+    index = g.index
+    if index.heaps > 2:
+        raise ValueError("Тепловая карта строится только для 1 или 2 куч")
+    block = [-(-w // max_side) for w in index.widths]
+    shape = tuple(-(-w // b) for w, b in zip(index.widths, block))
+    known = solver._label != UNKNOWN
+    codes = ((solver._dist.astype(np.uint32) << 2) | solver._label)[known]
+    states = g.states[known]
+    orders = [(0, 1), (1, 0)] if g.symmetric else [tuple(range(index.heaps))]
+    empty = np.iinfo(np.uint32).max
+    img = np.full(shape, empty, dtype=np.uint32)
+    for order in orders:
+        cell = tuple((states[:, k] - index.lo[i]) // block[i] for i, k in enumerate(order))
+        np.minimum.at(img, cell, codes)
+    img[img == empty] = 0
+    if index.heaps == 1:
+        img = np.repeat(img[None, :], max(1, shape[0] // 16), axis=0)
+    return _colorize(img)
+
+
+def _colorize(codes: "np.ndarray") -> "np.ndarray":
+    label, dist = decode_outcomes(codes)
+    # Чем дольше до конца партии, тем темнее: 1 ход — полная яркость, от 8 ходов — треть
+    fade = 1.0 - np.minimum(np.maximum(dist - 1, 0), 7) / 10.5
+    rgb = np.empty(codes.shape + (3,), dtype=np.uint8)
+    rgb[...] = _COLOR_UNKNOWN
+    rgb[label == DRAW] = _COLOR_DRAW
+    for lab, color in ((WIN, _COLOR_WIN), (LOSE, _COLOR_LOSE)):
+        mask = label == lab
+        rgb[mask] = (np.array(color)[None, :] * fade[mask][:, None]).astype(np.uint8)
+    rgb[(label == LOSE) & (dist == 0)] = _COLOR_FINAL
+    return rgb
+
+
+def write_png(path: str, rgb: "np.ndarray") -> None:
+    """Минимальный PNG-писатель (RGB, 8 бит, без фильтров) — без Pillow и Qt."""
+    h, w, _ = rgb.shape
+    raw = np.concatenate([np.zeros((h, 1), dtype=np.uint8), rgb.reshape(h, w * 3)], axis=1).tobytes()
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(raw, 6)))
+        f.write(chunk(b"IEND", b""))
+
+
+def write_heatmap_png(solver: "RetroSolver", path: str, max_side: int = 1024) -> None:
+    write_png(path, outcome_heatmap(solver, max_side))
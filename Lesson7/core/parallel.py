@@ -0,0 +1,125 @@
+import multiprocessing as mp
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from .rules import GameRules
+
+# Интервал опроса cancel_cb, пока шарды считаются в других процессах (сек)
+POLL_INTERVAL = 0.1
+# Шардов на процесс: мельче шард — чаще прогресс и ровнее загрузка, но больше повторных построений
+SHARDS_PER_WORKER = 4
+
+_cancel_event = None  # устанавливается в каждом процессе пула
+_shard_done = None    # общий массив: сколько S решено в каждом шарде (пишет только процесс шарда)
+
+
+def _init_worker(event, shard_done) -> None:
+    global _cancel_event, _shard_done
+    _cancel_event = event
+    _shard_done = shard_done
+
+
+def _worker_cancelled() -> bool:
+    return _cancel_event is not None and _cancel_event.is_set()
+
+
+def _solve_shard(k: int, solver_cls: Type, rules: GameRules, start_template: Tuple[Optional[int], ...],
+                 s_min: int, s_max: int,
+                 solver_kwargs: Dict[str, Any]) -> Tuple[Tuple[List[int], List[int], List[int]], Optional[str]]:
+    def progress(done: int, _total: int) -> None:
+        _shard_done[k] = done
+
+    solver = solver_cls(rules, start_template, s_min, s_max, **solver_kwargs)
+    lists = solver.solve_all(progress_cb=progress, cancel_cb=_worker_cancelled)
+    return lists, solver.status
+
+
+def split_range(s_min: int, s_max: int, shards: int) -> List[Tuple[int, int]]:
+    """Разбить [s_min; s_max] на не более чем shards соседних непустых отрезков."""
+    total = s_max - s_min + 1
+    shards = max(1, min(shards, total))
+    step, extra = divmod(total, shards)
+    res = []
+    lo = s_min
+    for k in range(shards):
+        hi = lo + step - 1 + (1 if k < extra else 0)
+        res.append((lo, hi))
+        lo = hi + 1
+    return res
+
+
+def solve_parallel(
+        solver_cls: Type,
+        rules: GameRules,
+        start_template: Tuple[Optional[int], ...],
+        s_min: int,
+        s_max: int,
+        solver_kwargs: Optional[Dict[str, Any]] = None,
+        workers: Optional[int] = None,
+        shards: Optional[int] = None,
+        progress_cb: Optional[Callable[[int, int], None]] = None,
+        cancel_cb: Optional[Callable[[], bool]] = None,
+        result_cb: Optional[Callable[[List[int], List[int], List[int]], None]] = None,
+) -> Tuple[Tuple[List[int], List[int], List[int]], List[Optional[str]]]:
+    """
+    Параллельный solve_all: диапазон S режется на соседние шарды, каждый шард решается
+    своим solver_cls в отдельном процессе (соседние S делят большую часть достижимых позиций,
+    так что дублирование работы между шардами ограничено их границами).
+    - progress_cb(сделано S, всего S) вызывается не чаще раза в POLL_INTERVAL сек: шарды пишут
+      свой прогресс в общий массив, так что он растёт и внутри шарда, а не только по готовности
+    - cancel_cb опрашивается каждые POLL_INTERVAL сек; отмена доходит и до уже запущенных шардов
+    - result_cb(новые_19, новые_20, новые_21) получает списки каждого готового шарда
+      (шарды завершаются в любом порядке)
+    Возвращает списки S и status каждого шарда (у шарда, исчерпавшего бюджет, списки частичные).
+    """
+    workers = workers or os.cpu_count() or 1
+    ranges = split_range(s_min, s_max, shards or workers * SHARDS_PER_WORKER)
+    total = s_max - s_min + 1
+    kwargs = solver_kwargs or {}
+
+    ctx = mp.get_context("spawn")  # безопасно и из потоков GUI
+    event = ctx.Event()
+    shard_done = ctx.Array("q", len(ranges), lock=False)
+    results: Dict[int, Tuple[List[int], List[int], List[int]]] = {}
+    statuses: List[Optional[str]] = [None] * len(ranges)
+    finished_size = [0] * len(ranges)  # у готового шарда решён весь отрезок, что бы он ни сообщил
+    reported = 0
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges)), mp_context=ctx,
+                             initializer=_init_worker, initargs=(event, shard_done)) as pool:
+        pending = {
+            pool.submit(_solve_shard, k, solver_cls, rules, start_template, lo, hi, kwargs): k
+            for k, (lo, hi) in enumerate(ranges)
+        }
+        try:
+            while pending:
+                if cancel_cb and cancel_cb():
+                    raise RuntimeError("CANCELLED")
+                finished, _ = wait(pending, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    k = pending.pop(fut)
+                    results[k], statuses[k] = fut.result()
+                    if result_cb:
+                        result_cb(*results[k])
+                    lo, hi = ranges[k]
+                    finished_size[k] = hi - lo + 1
+                if progress_cb:
+                    done = sum(max(a, b) for a, b in zip(shard_done, finished_size))
+                    if done != reported:
+                        reported = done
+                        progress_cb(done, total)
+        except BaseException:
+            event.set()
+            for fut in pending:
+                fut.cancel()
+            raise
+
+    s_list_19: List[int] = []
+    s_list_20: List[int] = []
+    s_list_21: List[int] = []
+    for k in range(len(ranges)):  # шарды идут по возрастанию S — списки остаются отсортированными
+        s19, s20, s21 = results[k]
+        s_list_19.extend(s19)
+        s_list_20.extend(s20)
+        s_list_21.extend(s21)
+    return (s_list_19, s_list_20, s_list_21), statuses
@@ -0,0 +1,396 @@
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .budget import Budget, BudgetExceeded
+from .cache import SolutionCache, cache_key, normalized_rules
+from .graph import MoveGraph
+from .memo import CachePolicy
+from .rules import GameRules
+from .solver import EGESolver
+from .states import StateIndex, np, require_numpy
+from .stats import approx_bytes
+from .tasks import DRAW, LOSE, UNKNOWN, WIN
+
+# Глубина (в полуходах), достаточная для точных ответов на задачи 19–21
+TASKS_DEPTH = 4
+
+
+class RetroSolver(EGESolver):
+    """
+    Ретроградный (восходящий) движок для задач 19–21 ЕГЭ.
+    Достижимая область один раз строится как граф ходов (MoveGraph, CSR),
+    исходы хранятся в массивах numpy: метка WIN/LOSE и расстояние —
+    число собственных ходов победителя до выигрыша. Слои выигрышных/проигрышных
+    позиций считаются векторными проходами по обратным рёбрам, после чего
+    задачи 19/20/21 для всего диапазона S — поиск по таблицам.
+    Граф может содержать циклы (вычитания, деления): при полном перечислении
+    позиции, не получившие метку, — ничьи (DRAW).
+    - max_depth: глубина перечисления в полуходах (None — всё достижимое множество).
+      Для задач 19–21 достаточно TASKS_DEPTH; позиции за горизонтом получают UNKNOWN,
+      и запросы к ним уходят в обычный перебор EGESolver.
+    - max_states: предел числа позиций в графе
+    - cache: дисковый кэш таблиц (SolutionCache); запись с тем же ключом и покрывающим
+      диапазоном S загружается вместо построения
+    - budget: как у EGESolver; построение проверяет срок между слоями, а лимит позиций
+      ограничивает размер графа. Если таблицы не успели построиться, результат пустой.
+    """
+
+    def __init__(self, rules: GameRules, start_template: Tuple[Optional[int], ...], s_min: int, s_max: int,
+                 max_depth: Optional[int] = None, max_states: int = 50_000_000,
+                 cache: Optional[SolutionCache] = None, profile: bool = False, budget: Optional[Budget] = None,
+                 cache_policy: Optional[CachePolicy] = None):
+        super().__init__(rules, start_template, s_min, s_max, profile=profile, budget=budget,
+                         cache_policy=cache_policy)
+        require_numpy()
+        self.max_depth = max_depth
+        self.max_states = max_states
+        self.cache = cache
+
+        self._starts = None  # int32 [число S]: вершина старта для каждого S
+        self._w1 = None      # bool [n]: есть ход в терминал
+        self._label = None   # uint8 [n]
+        self._dist = None    # int32 [n]
+        self._span: Optional[Tuple[int, int]] = None  # диапазон S, из стартов которого построен граф
+
+    def _solver_kwargs(self) -> Dict[str, Any]:
+        # Кэш в шарды не передаётся: у шардов один ключ, но разные диапазоны S
+        return dict(max_depth=self.max_depth, max_states=self.max_states, profile=self.stats.timed,
+                    budget=self._shard_budget(), cache_policy=self.cache_policy)
+
+    # ---------- Построение таблиц ----------
+    def build(self, cancel_cb: Optional[Callable[[], bool]] = None) -> None:
+        if self._label is not None:
+            return
+        with self.stats.phase("cache_load"):
+            loaded = self._load_cached()
+        if not loaded:
+            # Вместе с прежним диапазоном и диапазоном записи кэша (set_range, _load_cached): иначе
+            # записанные таблицы заменили бы в кэше более широкие
+            lo, hi = self._span or (self.s_min, self.s_max)
+            self._span = (min(lo, self.s_min), max(hi, self.s_max))
+            S = np.arange(self._span[0], self._span[1] + 1)
+            starts = (self._start_from_S(int(s)) for s in S)
+            limit = self.max_states
+            budget = self._active
+            if budget is not None and budget.states is not None:
+                limit = min(limit, max(0, budget.states - (self.stats.states_generated - self._states0)))
+            with self.stats.phase("graph"):
+                try:
+                    self.graph = MoveGraph.build(self.game, starts, self.max_depth, limit, cancel_cb)
+                except ValueError:
+                    if limit < self.max_states:
+                        raise BudgetExceeded("Исчерпан бюджет позиций") from None
+                    raise
+                self._starts = self._start_nodes()
+            with self.stats.phase("retrograde"):
+                self._retrograde(cancel_cb)
+            with self.stats.phase("cache_store"):
+                self._store_cached()
+        self.stats.states_generated += self.graph.size
+
+    def _start_nodes(self) -> "np.ndarray":
+        S = np.arange(self.s_min, self.s_max + 1)
+        return self.graph.nodes([S if v is None else np.full(S.shape, v) for v in self.start_tmpl])
+
+    def set_range(self, s_min: int, s_max: int) -> None:
+        """
+        Таблицы остаются, если граф уже содержит раскрытые старты нового диапазона
+        (при заданном max_depth — именно как старты, на глубине 0); иначе строятся заново при следующем запросе —
+        для объединения прежнего и нового диапазонов.
+        """
+        super().set_range(s_min, s_max)
+        if self._label is None:
+            return
+        starts = self._start_nodes()
+        ok = bool((starts >= 0).all()) and bool(self.graph.expanded[starts].all())
+        if ok and self.max_depth is not None:
+            ok = bool((self.graph.depth[starts] == 0).all())
+        if ok:
+            self._starts = starts
+        else:
+            self.graph = None
+            self._starts = self._w1 = self._label = self._dist = None
+
+    # ---------- Дисковый кэш ----------
+    def _cache_key(self) -> str:
+        return cache_key(self.rules, self.start_tmpl, self.max_depth)
+
+    def _load_cached(self) -> bool:
+        if self.cache is None:
+            return False
+        entry = self.cache.load(self._cache_key())
+        if entry is None:
+            return False
+        if not entry.covers(self.s_min, self.s_max):
+            # Таблицы построятся и для S записи, чтобы новая запись её заменила, а не потеряла
+            lo, hi = self._span or (entry.s_min, entry.s_max)
+            self._span = (min(lo, entry.s_min), max(hi, entry.s_max))
+            return False
+        a = entry.arrays
+        index = StateIndex(tuple(entry.meta["index_lo"]), tuple(entry.meta["index_hi"]))
+        self.graph = MoveGraph.from_arrays(self.rules, index, a["states"], a["offsets"], a["targets"],
+                                           a["terminal"], a["expanded"], a["depth"], self.game.symmetric)
+        self._w1, self._label, self._dist = a["w1"], a["label"], a["dist"]
+        self._starts = self._start_nodes()
+        self._span = (entry.s_min, entry.s_max)
+        return True
+
+    def _store_cached(self) -> None:
+        if self.cache is None:
+            return
+        lo, hi = self._span
+        old = self.cache.load(self._cache_key())
+        if old is not None and not (lo <= old.s_min and old.s_max <= hi):
+            return  # запись покрывает S, которых в этих таблицах нет: не заменять её более узкой
+        del old  # массивы записи отображены в память; файл сейчас будет заменён
+        g = self.graph
+        meta = dict(rules=normalized_rules(self.rules), start_template=list(self.start_tmpl),
+                    max_depth=self.max_depth, s_min=lo, s_max=hi,
+                    index_lo=list(g.index.lo), index_hi=list(g.index.hi))
+        self.cache.store(self._cache_key(), meta, dict(
+            states=g.states, offsets=g.offsets, targets=g.targets, terminal=g.terminal,
+            expanded=g.expanded, depth=g.depth, w1=self._w1, label=self._label, dist=self._dist,
+        ))
+
+    def cached(self) -> bool:
+        """В кэше есть таблицы, покрывающие диапазон S этого solver'а."""
+        if self.cache is None:
+            return False
+        entry = self.cache.load(self._cache_key())
+        return entry is not None and entry.covers(self.s_min, self.s_max)
+
+    def _retrograde(self, cancel_cb: Optional[Callable[[], bool]]) -> None:
+        """
+        Послойный ретроградный анализ со счётчиками ходов:
+          LOSE_0 — терминалы (и нетерминальные позиции без ходов);
+          WIN_n  — неразмеченные позиции с ходом в LOSE_{n-1};
+          LOSE_n — позиции, у которых после слоя WIN_n все ходы ведут в WIN.
+        Каждое ребро просматривается не более двух раз — время линейно по размеру графа.
+        Если граф полный (раскрыты все нетерминальные позиции), неразмеченные позиции — ничьи:
+        ходящий не может выиграть, но всегда может уйти в позицию, из которой не выигрывает соперник.
+        Иначе позиции с нераскрытыми ходами (за горизонтом) и зависящие от них остаются UNKNOWN.
+        """
+        g = self.graph
+        n = g.size
+        term = g.terminal
+        label = np.zeros(n, dtype=np.uint8)
+        dist = np.zeros(n, dtype=np.int32)
+
+        src = g.edge_sources()
+        self._w1 = np.zeros(n, dtype=bool)
+        self._w1[src[term[g.targets]]] = True
+
+        # Обратные рёбра (только из раскрытых нетерминальных позиций) в CSR
+        keep = ~term[src]
+        e_src, e_dst = src[keep], g.targets[keep]
+        pred = e_src[np.argsort(e_dst, kind="stable")]
+        pred_off = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(e_dst, minlength=n), out=pred_off[1:])
+
+        def preds(nodes: "np.ndarray") -> "np.ndarray":
+            lo, hi = pred_off[nodes], pred_off[nodes + 1]
+            lens = hi - lo
+            total = int(lens.sum())
+            if total == 0:
+                return np.empty(0, dtype=np.int32)
+            shift = np.repeat(lo - np.cumsum(lens) + lens, lens)
+            return pred[shift + np.arange(total)]
+
+        # Счётчик ещё не выигрышных для соперника ходов; у нераскрытой позиции он не обнулится никогда
+        cnt = g.degree().astype(np.int32)
+        cnt[~g.expanded] = 1
+
+        label[term] = LOSE
+        stuck = ~term & (cnt == 0)
+        label[stuck] = LOSE
+        lose_layer = np.flatnonzero(term | stuck)
+
+        layer = 0
+        while True:
+            if cancel_cb and cancel_cb():
+                raise RuntimeError("CANCELLED")
+            layer += 1
+            cand = np.unique(preds(lose_layer))
+            win_layer = cand[label[cand] == UNKNOWN]
+            if not win_layer.size:
+                break
+            label[win_layer] = WIN
+            dist[win_layer] = layer
+
+            touched, hits = np.unique(preds(win_layer), return_counts=True)
+            cnt[touched] -= hits.astype(np.int32)
+            lose_layer = touched[(cnt[touched] == 0) & (label[touched] == UNKNOWN)]
+            label[lose_layer] = LOSE
+            dist[lose_layer] = layer
+
+        if (g.expanded | term).all():
+            label[label == UNKNOWN] = DRAW
+        self._label, self._dist = label, dist
+
+    def stats_report(self) -> Dict[str, Any]:
+        res = super().stats_report()
+        if self._label is not None:
+            g = self.graph
+            tables = dict(states=g.states, offsets=g.offsets, targets=g.targets, terminal=g.terminal,
+                          expanded=g.expanded, depth=g.depth, w1=self._w1, label=self._label, dist=self._dist)
+            res["graph"] = dict(nodes=g.size, edges=g.edges, symmetric=g.symmetric)
+            res["memory_bytes"]["tables"] = sum(approx_bytes(a) for a in tables.values())
+        return res
+
+    # ---------- Запросы к таблицам ----------
+    def _exact_for(self, v: int, plies: int) -> bool:
+        """Метка вершины v точна для вопросов, которые смотрят на plies полуходов вперёд."""
+        return self.max_depth is None or int(self.graph.depth[v]) + plies <= self.max_depth
+
+    def _win_within_idx(self, v: int, k: int) -> Optional[bool]:
+        if self._label[v] == WIN and self._dist[v] <= k:
+            return True
+        if self._label[v] == LOSE or self._exact_for(v, 2 * k - 1):
+            return False
+        return None
+
+    def _lookup(self, state: Tuple[int, ...]) -> int:
+        return self.graph.node(state) if self._label is not None else -1
+
+    def outcome(self, state: Tuple[int, ...]) -> Tuple[int, int]:
+        """(метка, расстояние) для позиции; (UNKNOWN, 0), если её нет в графе."""
+        self.build()
+        v = self.graph.node(state)
+        if v < 0:
+            return UNKNOWN, 0
+        return int(self._label[v]), int(self._dist[v])
+
+    @property
+    def states_count(self) -> int:
+        """Число позиций, достигнутых из стартов."""
+        self.build()
+        return self.graph.size
+
+    # ---------- Переопределения EGESolver (для sample_strategy_*) ----------
+    def _has_move_to_terminal(self, state: Tuple[int, ...]) -> bool:
+        v = self._lookup(state)
+        if v >= 0 and self.graph.expanded[v]:
+            return bool(self._w1[v])
+        return super()._has_move_to_terminal(state)
+
+    def _can_win_in(self, state: Tuple[int, ...], k: int) -> bool:
+        v = self._lookup(state)
+        res = self._win_within_idx(v, k) if v >= 0 else None
+        return super()._can_win_in(state, k) if res is None else res
+
+    def sample_strategy_19(self, S: int, limit_examples: int = 8) -> Optional[str]:
+        self.build()
+        return super().sample_strategy_19(S, limit_examples)
+
+    def sample_strategy_20(self, S: int, limit_examples: int = 6) -> Optional[str]:
+        self.build()
+        return super().sample_strategy_20(S, limit_examples)
+
+    def sample_strategy_21(self, S: int, limit_examples: int = 6) -> Optional[str]:
+        self.build()
+        return super().sample_strategy_21(S, limit_examples)
+
+    def strategy_dag(self, task: int, S: int):
+        self.build()
+        return super().strategy_dag(task, S)
+
+    # ---------- Перебор ----------
+    def start_outcomes(
+            self,
+            max_moves: Optional[int],
+            progress_cb: Optional[Callable[[int, int], None]] = None,
+            cancel_cb: Optional[Callable[[], bool]] = None,
+    ) -> List[Tuple[int, int, int]]:
+        """
+        max_moves=None — без ограничения: точные WIN/LOSE/DRAW по полному графу
+        (при заданном max_depth позиции за горизонтом остаются UNKNOWN).
+        """
+        if max_moves is not None and self.max_depth is not None and self.max_depth < 2 * max_moves:
+            return super().start_outcomes(max_moves, progress_cb, cancel_cb)
+        with self._guarded(cancel_cb):
+            self.build(self._interrupted)
+        if self._label is None:  # бюджет кончился до готовности таблиц
+            return []
+        label = self._label[self._starts]
+        dist = self._dist[self._starts]
+        if max_moves is not None:
+            # Исходы, которые решаются дольше max_moves ходов (и ничьи), для вопроса неотличимы от неизвестных
+            far = (dist > max_moves) | (label == DRAW)
+            label = np.where(far, UNKNOWN, label)
+            dist = np.where(far, 0, dist)
+        if progress_cb:
+            progress_cb(len(label), len(label))
+        S = range(self.s_min, self.s_max + 1)
+        return list(zip(S, label.tolist(), dist.tolist()))
+
+    def solve_all_parallel(
+            self,
+            workers: Optional[int] = None,
+            progress_cb: Optional[Callable[[int, int], None]] = None,
+            cancel_cb: Optional[Callable[[], bool]] = None,
+            result_cb: Optional[Callable[[List[int], List[int], List[int]], None]] = None,
+    ) -> Tuple[List[int], List[int], List[int]]:
+        if self._label is not None or self.cached():  # таблицы уже есть — пул процессов не нужен
+            return self.solve_all(progress_cb, cancel_cb, result_cb)
+        return super().solve_all_parallel(workers, progress_cb, cancel_cb, result_cb)
+
+    def solve_all(
+            self,
+            progress_cb: Optional[Callable[[int, int], None]] = None,
+            cancel_cb: Optional[Callable[[], bool]] = None,
+            result_cb: Optional[Callable[[List[int], List[int], List[int]], None]] = None,
+    ) -> Tuple[List[int], List[int], List[int]]:
+        if self.max_depth is not None and self.max_depth < TASKS_DEPTH:
+            return super().solve_all(progress_cb, cancel_cb, result_cb)
+        s_list_19: List[int] = []
+        s_list_20: List[int] = []
+        s_list_21: List[int] = []
+        with self._guarded(cancel_cb):
+            self.build(self._interrupted)
+            t0 = time.perf_counter()
+            self._solve_tables(s_list_19, s_list_20, s_list_21, progress_cb, result_cb)
+            self.stats.add_time("solve", time.perf_counter() - t0)
+        return s_list_19, s_list_20, s_list_21
+
+    def _solve_tables(
+            self,
+            s_list_19: List[int],
+            s_list_20: List[int],
+            s_list_21: List[int],
+            progress_cb: Optional[Callable[[int, int], None]],
+            result_cb: Optional[Callable[[List[int], List[int], List[int]], None]],
+    ) -> None:
+        # Счётчики по ходам каждой вершины: сколько ходов ведут в позиции с W1 / с W≤2
+        g = self.graph
+        src = g.edge_sources()
+        w1 = self._w1
+        win2 = (self._label == WIN) & (self._dist <= 2)
+        deg = g.degree()
+        succ_w1 = np.bincount(src, weights=w1[g.targets], minlength=g.size)
+        succ_win2 = np.bincount(src, weights=win2[g.targets], minlength=g.size)
+
+        total = self.s_max - self.s_min + 1
+        chunk = 4096
+        for lo in range(0, total, chunk):
+            if self._interrupted():
+                raise RuntimeError("CANCELLED")
+            v = self._starts[lo:lo + chunk]
+            S = np.arange(self.s_min + lo, self.s_min + lo + len(v))
+            # Петя выигрывает первым ходом — ни одна из задач не подходит
+            open_start = ~w1[v]
+
+            # 19: для любого хода Пети Ваня выигрывает за 1
+            ok19 = open_start & (deg[v] > 0) & (succ_w1[v] == deg[v])
+            # 20: Петя выигрывает своим вторым ходом при любой игре Вани
+            ok20 = open_start & win2[v]
+            # 21: у Вани W2 при любой игре Пети; и нет гарантии W1
+            ok21 = open_start & (succ_win2[v] == deg[v]) & (succ_w1[v] < deg[v])
+
+            new19, new20, new21 = S[ok19].tolist(), S[ok20].tolist(), S[ok21].tolist()
+            s_list_19.extend(new19)
+            s_list_20.extend(new20)
+            s_list_21.extend(new21)
+            if result_cb and (new19 or new20 or new21):
+                result_cb(new19, new20, new21)
+            if progress_cb:
+                progress_cb(lo + len(v), total)
@@ -13,7 +13,7 @@ class GameRules:
     - adds: целочисленные сдвиги (могут быть отрицательными), 0 исключается
     - mults: множители (целые >= 2)
     - divs: делители (целые >= 2), результат — целочисленное деление (округление вниз)
-    - heaps: количество куч (1 или 2)
+    - heaps: количество куч (>= 1)
     """
     target_mode: str = "sum"
     target: int = 100
@@ -27,8 +27,8 @@ class GameRules:
     heaps: int = 2
 
     def __post_init__(self):
-        if self.heaps not in (1, 2):
-            raise ValueError("heaps должен быть 1 или 2")
+        if self.heaps < 1:
+            raise ValueError("heaps должен быть не меньше 1")
 
         if self.finish_cmp not in ("ge", "lt"):
             raise ValueError("finish_cmp должен быть 'ge' или 'lt'")
@@ -0,0 +1,183 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional, Tuple
+
+from .budget import BUDGET_EXCEEDED
+from .cache import normalized_rules
+from .rules import GameRules
+from .solver import EGESolver
+from .strategy import StrategyDAG
+
+SolverFactory = Callable[[GameRules, Tuple[Optional[int], ...], int, int], EGESolver]
+
+
+class _Entry:
+    """Живой solver для одной пары (правила, шаблон) и всё, что он уже нашёл."""
+
+    def __init__(self, solver: EGESolver):
+        self.solver = solver
+        self.covered: List[Tuple[int, int]] = []  # решённые отрезки S, по возрастанию, без пересечений
+        self.found: Tuple[set, set, set] = (set(), set(), set())
+
+    def gaps(self, s_min: int, s_max: int) -> List[Tuple[int, int]]:
+        res = []
+        lo = s_min
+        for a, b in self.covered:
+            if b < lo:
+                continue
+            if a > s_max:
+                break
+            if a > lo:
+                res.append((lo, a - 1))
+            lo = max(lo, b + 1)
+        if lo <= s_max:
+            res.append((lo, s_max))
+        return res
+
+    def cover(self, lo: int, hi: int) -> None:
+        merged = []
+        for a, b in sorted(self.covered + [(lo, hi)]):
+            if merged and a <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], b))
+            else:
+                merged.append((a, b))
+        self.covered = merged
+
+    def results(self, s_min: int, s_max: int) -> Tuple[List[int], List[int], List[int]]:
+        return tuple(sorted(S for S in found if s_min <= S <= s_max) for found in self.found)
+
+
+class SolverSession:
+    """
+    Живые solver'ы между пересчётами: ключ — нормализованные правила и шаблон старта.
+    - solve_all считает только те S, которых ещё не было для этого ключа (кэши позиций solver'а
+      при этом переиспользуются), остальные берёт из уже найденного;
+    - sample_strategy/strategy_dag строят объяснение тем же solver'ом — на его кэшах и таблицах;
+    - хранится не больше max_entries ключей, давно не использованные вытесняются.
+    Вызовы потокобезопасны; если solver занят расчётом в другом потоке, стратегия строится
+    отдельным временным solver'ом, а не ждёт окончания расчёта.
+    """
+
+    def __init__(self, factory: SolverFactory = EGESolver, max_entries: int = 8):
+        self.factory = factory
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(rules: GameRules, start_template: Tuple[Optional[int], ...]) -> str:
+        return json.dumps([normalized_rules(rules), list(start_template)], sort_keys=True)
+
+    def _entry(self, rules: GameRules, start_template: Tuple[Optional[int], ...], s_min: int, s_max: int) -> _Entry:
+        key = self._key(rules, start_template)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = _Entry(self.factory(rules, start_template, s_min, s_max))
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self._entries.move_to_end(key)
+        return entry
+
+    def solver(self, rules: GameRules, start_template: Tuple[Optional[int], ...],
+               wait: bool = True) -> Optional[EGESolver]:
+        """
+        Живой solver для ключа или None, если его нет.
+        wait=False — не ждать, пока идёт расчёт в другом потоке (для GUI): тогда тоже None.
+        """
+        if not self._lock.acquire(blocking=wait):
+            return None
+        try:
+            entry = self._entries.get(self._key(rules, start_template))
+            return entry.solver if entry is not None else None
+        finally:
+            self._lock.release()
+
+    def results(self, rules: GameRules, start_template: Tuple[Optional[int], ...],
+                s_min: int, s_max: int) -> Tuple[List[int], List[int], List[int]]:
+        """Уже найденные S из [s_min; s_max] (в том числе от прерванных расчётов)."""
+        with self._lock:
+            entry = self._entries.get(self._key(rules, start_template))
+            return entry.results(s_min, s_max) if entry is not None else ([], [], [])
+
+    def solve_all(
+            self,
+            rules: GameRules,
+            start_template: Tuple[Optional[int], ...],
+            s_min: int,
+            s_max: int,
+            workers: int = 1,
+            progress_cb: Optional[Callable[[int, int], None]] = None,
+            cancel_cb: Optional[Callable[[], bool]] = None,
+            result_cb: Optional[Callable[[List[int], List[int], List[int]], None]] = None,
+    ) -> Tuple[List[int], List[int], List[int]]:
+        """
+        Как EGESolver.solve_all для [s_min; s_max], но считаются только новые S.
+        progress_cb получает (сделано, всего) по новым S; result_cb сначала получает уже известное.
+        Если бюджет solver'а исчерпан, возвращается найденное к этому моменту, остаток не помечается решённым.
+        """
+        s_min, s_max = min(s_min, s_max), max(s_min, s_max)
+        with self._lock:
+            entry = self._entry(rules, start_template, s_min, s_max)
+            if result_cb:
+                known = entry.results(s_min, s_max)
+                if any(known):
+                    result_cb(*known)
+
+            gaps = entry.gaps(s_min, s_max)
+            total = sum(hi - lo + 1 for lo, hi in gaps)
+            done = 0
+
+            def on_result(s19: List[int], s20: List[int], s21: List[int]) -> None:
+                for found, new in zip(entry.found, (s19, s20, s21)):
+                    found.update(new)
+                if result_cb:
+                    result_cb(s19, s20, s21)
+
+            for lo, hi in gaps:
+                solver = entry.solver
+                solver.set_range(lo, hi)
+                shard_progress = None
+                if progress_cb:
+                    def shard_progress(i: int, _total: int, base: int = done) -> None:
+                        progress_cb(base + i, total)
+                if workers > 1:
+                    lists = solver.solve_all_parallel(workers, shard_progress, cancel_cb, on_result)
+                else:
+                    lists = solver.solve_all(shard_progress, cancel_cb, on_result)
+                # Без result_cb у движка итог всё равно надо запомнить
+                for found, new in zip(entry.found, lists):
+                    found.update(new)
+                if solver.status == BUDGET_EXCEEDED:  # отрезок решён не целиком — при следующем вызове досчитается
+                    break
+                entry.cover(lo, hi)
+                done += hi - lo + 1
+            return entry.results(s_min, s_max)
+
+    def _on_solver(self, rules: GameRules, start_template: Tuple[Optional[int], ...], S: int,
+                   fn: Callable[[EGESolver], Any]) -> Any:
+        if not self._lock.acquire(blocking=False):
+            return fn(self.factory(rules, start_template, S, S))
+        try:
+            return fn(self._entry(rules, start_template, S, S).solver)
+        finally:
+            self._lock.release()
+
+    def sample_strategy(self, rules: GameRules, start_template: Tuple[Optional[int], ...], task: int, S: int,
+                        limit_examples: Optional[int] = None) -> Optional[str]:
+        """Текст стратегии для задачи task (19/20/21) и старта S."""
+        if task not in (19, 20, 21):
+            raise ValueError("task должен быть 19, 20 или 21")
+        kwargs = {} if limit_examples is None else dict(limit_examples=limit_examples)
+        return self._on_solver(rules, start_template, S,
+                               lambda solver: getattr(solver, f"sample_strategy_{task}")(S, **kwargs))
+
+    def strategy_dag(self, rules: GameRules, start_template: Tuple[Optional[int], ...], task: int,
+                     S: int) -> Optional[StrategyDAG]:
+        """Полная стратегия (DAG) для задачи task и старта S."""
+        return self._on_solver(rules, start_template, S, lambda solver: solver.strategy_dag(task, S))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
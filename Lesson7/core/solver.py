@@ -1,7 +1,17 @@
-from typing import List, Tuple, Optional, Dict, Callable
+import functools
+import time
+from contextlib import contextmanager
+from typing import Any, List, Tuple, Optional, Dict, Callable, Iterator, Sequence
 
+from .budget import BUDGET_EXCEEDED, CANCELLED, CHECK_EVERY, DONE, Budget, BudgetExceeded
 from .game import Game
+from .graph import MoveGraph
+from .memo import CachePolicy, Memo
+from .parallel import solve_parallel
 from .rules import GameRules
+from .stats import SolverStats, approx_bytes
+from .strategy import StrategyDAG, build_strategy
+from .tasks import LOSE, UNKNOWN, WIN, TaskQuery
 
 
 class EGESolver:
@@ -11,9 +21,18 @@ class EGESolver:
     - start_template: кортеж начальных куч, где ровно одно значение — None (там будет S)
       Примеры: (None,), (5, None)
     - s_min, s_max: диапазон S, включительно
+    - graph: готовый граф ходов (MoveGraph); ходы раскрытых в нём позиций берутся из него
+    - profile: замерять время генерации ходов и проверок терминала (счётчики ведутся всегда, см. stats_report)
+    - budget: ограничение времени/числа позиций на каждый расчёт (Budget). Отмена и бюджет проверяются
+      и внутри перебора одного S; при исчерпании бюджета solve_all/start_outcomes возвращают то,
+      что успели, а status становится BUDGET_EXCEEDED
+    - cache_policy: ограничение памяти кэшей (CachePolicy); по умолчанию кэши растут без ограничения
+    Кэши исходов ключуются по Game.canonical: при симметричных правилах перестановки куч считаются один раз.
     """
 
-    def __init__(self, rules: GameRules, start_template: Tuple[Optional[int], ...], s_min: int, s_max: int):
+    def __init__(self, rules: GameRules, start_template: Tuple[Optional[int], ...], s_min: int, s_max: int,
+                 graph: Optional[MoveGraph] = None, profile: bool = False, budget: Optional[Budget] = None,
+                 cache_policy: Optional[CachePolicy] = None):
         self.rules = rules
         self.start_tmpl = start_template
         self.s_min = min(s_min, s_max)
@@ -28,33 +47,139 @@ class EGESolver:
 
         # Game + кэши
         self.game = Game(self.rules)
+        self.graph = graph
+        self.stats = SolverStats(timed=profile)
+        self.game.stats = self.stats
         self._moves_cache: Dict[Tuple[int, ...], Tuple[Tuple[int, ...], ...]] = {}
         self._w1_cache: Dict[Tuple[int, ...], bool] = {}
         self._can_cache: Dict[Tuple[Tuple[int, ...], int], bool] = {}
+        # state -> (метка, расстояние, просмотрено полуходов)
+        self._outcome_cache: Dict[Tuple[int, ...], Tuple[int, int, int]] = {}
+        self.cache_policy = cache_policy or CachePolicy()
+        self._bind_memos()
+
+        # Отмена и бюджет текущего расчёта (см. _guarded)
+        self.budget = budget
+        self.status: Optional[str] = None  # DONE / CANCELLED / BUDGET_EXCEEDED последнего расчёта
+        self._active: Optional[Budget] = None
+        self._cancel_cb: Optional[Callable[[], bool]] = None
+        self._guard_depth = 0
+        self._states0 = 0
+        self._ticks = CHECK_EVERY
+
+    def set_range(self, s_min: int, s_max: int) -> None:
+        """Сменить диапазон S; кэши позиций остаются и работают на новый диапазон."""
+        self.s_min = min(s_min, s_max)
+        self.s_max = max(s_min, s_max)
 
     def _start_from_S(self, S: int) -> Tuple[int, ...]:
         st = list(self.start_tmpl)
         st[self.var_idx] = S
         return tuple(st)
 
+    def _bind_memos(self) -> None:
+        """
+        Запись в кэши и поиск вытесненного — через Memo, если память ограничена;
+        иначе запись — прямо в dict, а искать вне его нечего. Попадания в любом случае — обычный dict.get.
+        """
+        policy = self.cache_policy
+        self._memos: Dict[str, Memo] = {}
+        if policy.bounded:
+            key_fns = dict(w1=lambda state: state, can=lambda key: key[0] + (key[1],))
+            for name, cache in self._caches().items():
+                on_rotate = functools.partial(self.stats.note_size, name)
+                self._memos[name] = Memo(cache, policy, key_fns.get(name), on_rotate)
+
+        def bind(name: str, cache: Dict) -> Tuple[Callable[[Any], Any], Callable[[Any, Any], None]]:
+            memo = self._memos.get(name)
+            return (memo.recall, memo.store) if memo is not None else (_absent, cache.__setitem__)
+
+        self._recall_moves, self._store_moves = bind("moves", self._moves_cache)
+        self._recall_w1, self._store_w1 = bind("w1", self._w1_cache)
+        self._recall_can, self._store_can = bind("can", self._can_cache)
+        self._recall_outcome, self._store_outcome = bind("outcome", self._outcome_cache)
+
+    # ---------- Отмена и бюджет ----------
+    @contextmanager
+    def _guarded(self, cancel_cb: Optional[Callable[[], bool]]) -> Iterator[None]:
+        """
+        Рамка одного расчёта: запускает часы бюджета и ставит status.
+        BudgetExceeded гасится здесь — расчёт возвращает частичный результат;
+        отмена, как и раньше, выходит наружу как RuntimeError("CANCELLED").
+        Вложенные рамки (переопределения, вызывающие базовый метод) работают внутри внешней.
+        """
+        if self._guard_depth:
+            yield
+            return
+        self._guard_depth = 1
+        self._cancel_cb = cancel_cb
+        self._active = self.budget.started() if self.budget is not None else None
+        self._states0 = self.stats.states_generated
+        self._ticks = CHECK_EVERY
+        self.status = None
+        try:
+            yield
+            self.status = DONE
+        except BudgetExceeded:
+            self.status = BUDGET_EXCEEDED
+        except RuntimeError as e:
+            if str(e) == "CANCELLED":
+                self.status = CANCELLED
+            raise
+        finally:
+            self._guard_depth = 0
+            self._cancel_cb = None
+            self._active = None
+
+    def _interrupted(self) -> bool:
+        """Отмена запрошена (True); при исчерпанном бюджете — BudgetExceeded."""
+        budget = self._active
+        if budget is not None:
+            if budget.expired():
+                raise BudgetExceeded("Истёк бюджет времени")
+            if budget.states is not None and self.stats.states_generated - self._states0 > budget.states:
+                raise BudgetExceeded("Исчерпан бюджет позиций")
+        return bool(self._cancel_cb and self._cancel_cb())
+
+    def _poll(self) -> None:
+        """Проверка раз в CHECK_EVERY шагов перебора — дешёвая, даже когда одно S считается долго."""
+        self._ticks = CHECK_EVERY
+        if self._guard_depth and self._interrupted():
+            raise RuntimeError("CANCELLED")
+
     def _moves(self, state: Tuple[int, ...]) -> Tuple[Tuple[int, ...], ...]:
         res = self._moves_cache.get(state)
+        if res is None:
+            res = self._recall_moves(state)
         if res is not None:
+            self.stats.hits["moves"] += 1
             return res
-        res = tuple(self.game.iter_moves(state))
-        self._moves_cache[state] = res
+        self.stats.misses["moves"] += 1
+        self._ticks -= 1
+        if self._ticks <= 0:
+            self._poll()
+        t0 = time.perf_counter() if self.stats.timed else 0.0
+        if self.graph is not None:
+            res = self.graph.moves(state)
+        if res is None:
+            res = tuple(self.game.iter_moves(state))
+        if self.stats.timed:
+            self.stats.add_time("moves", time.perf_counter() - t0)
+        self._store_moves(state, res)
         return res
 
     def _has_move_to_terminal(self, state: Tuple[int, ...]) -> bool:
+        state = self.game.canonical(state)
         cached = self._w1_cache.get(state)
+        if cached is None:
+            cached = self._recall_w1(state)
         if cached is not None:
+            self.stats.hits["w1"] += 1
             return cached
-        for nxt in self._moves(state):
-            if self.game.is_terminal(nxt):
-                self._w1_cache[state] = True
-                return True
-        self._w1_cache[state] = False
-        return False
+        self.stats.misses["w1"] += 1
+        res = any(self.game.is_terminal(nxt) for nxt in self._moves(state))
+        self._store_w1(state, res)
+        return res
 
     def _can_win_in(self, state: Tuple[int, ...], k: int) -> bool:
         """
@@ -65,31 +190,83 @@ class EGESolver:
             * если s1 терминал -> True
             * иначе для всех ответов соперника s2: _can_win_in(s2, k-1) == True
         """
+        state = self.game.canonical(state)
         key = (state, k)
-        if key in self._can_cache:
-            return self._can_cache[key]
+        cached = self._can_cache.get(key)
+        if cached is None:
+            cached = self._recall_can(key)
+        if cached is not None:
+            self.stats.hits["can"] += 1
+            return cached
+        self.stats.misses["can"] += 1
+        self._ticks -= 1
+        if self._ticks <= 0:
+            self._poll()
 
-        if self.game.is_terminal(state):
-            self._can_cache[key] = False
-            return False
-        if k == 0:
-            self._can_cache[key] = False
-            return False
+        res = False
+        if k > 0 and not self.game.is_terminal(state):
+            for s1 in self._moves(state):
+                if self.game.is_terminal(s1):
+                    res = True
+                    break
+                opp_moves = self._moves(s1)
+                if not opp_moves or all(self._can_win_in(s2, k - 1) for s2 in opp_moves):
+                    res = True
+                    break
+        self._store_can(key, res)
+        return res
 
-        for s1 in self._moves(state):
-            if self.game.is_terminal(s1):
-                self._can_cache[key] = True
-                return True
-            opp_moves = self._moves(s1)
-            if not opp_moves:
-                self._can_cache[key] = True
-                return True
-            if all(self._can_win_in(s2, k - 1) for s2 in opp_moves):
-                self._can_cache[key] = True
-                return True
+    def _outcome_within(self, state: Tuple[int, ...], plies: int) -> Tuple[int, int]:
+        """
+        Исход позиции, если он решается за plies полуходов:
+        - (WIN, n): ходящий выигрывает своим n-м ходом (2n - 1 <= plies), n — наименьшее;
+        - (LOSE, n): соперник выигрывает своим n-м ходом (2n <= plies), n — наибольшее при затягивании;
+        - (UNKNOWN, 0): за plies полуходов исход не решается.
+        Найденные исходы точны и переиспользуются для любых plies — рекурсия не повторяется для каждого k.
+        """
+        state = self.game.canonical(state)
+        cached = self._outcome_cache.get(state)
+        if cached is None:
+            cached = self._recall_outcome(state)
+        if cached is not None:
+            label, dist, seen = cached
+            if label != UNKNOWN:
+                self.stats.hits["outcome"] += 1
+                need = 2 * dist - 1 if label == WIN else 2 * dist
+                return (label, dist) if need <= plies else (UNKNOWN, 0)
+            if seen >= plies:
+                self.stats.hits["outcome"] += 1
+                return UNKNOWN, 0
+        self.stats.misses["outcome"] += 1
+        self._ticks -= 1
+        if self._ticks <= 0:
+            self._poll()
 
-        self._can_cache[key] = False
-        return False
+        if self.game.is_terminal(state):
+            res = (LOSE, 0)
+        elif plies == 0:
+            res = (UNKNOWN, 0)
+        else:
+            best_win: Optional[int] = None
+            worst_lose = 0
+            all_win = True
+            for nxt in self._moves(state):
+                label, dist = self._outcome_within(nxt, plies - 1)
+                if label == LOSE:
+                    best_win = dist + 1 if best_win is None else min(best_win, dist + 1)
+                    all_win = False
+                elif label == WIN:
+                    worst_lose = max(worst_lose, dist)
+                else:
+                    all_win = False
+            if best_win is not None:
+                res = (WIN, best_win)
+            elif all_win:  # сюда же попадает нетерминальная позиция без ходов
+                res = (LOSE, worst_lose)
+            else:
+                res = (UNKNOWN, 0)
+        self._store_outcome(state, (res[0], res[1], plies))
+        return res
 
     # ---------- Форматирование/стратегии ----------
     def fmt_state(self, st: Tuple[int, ...]) -> str:
@@ -212,24 +389,49 @@ class EGESolver:
             return "\n".join(lines)
         return None
 
+    def strategy_dag(self, task: int, S: int) -> Optional[StrategyDAG]:
+        """Полная стратегия для задачи 19/20/21 и S (см. core.strategy) или None, если S не подходит."""
+        return build_strategy(self, task, S)
+
     # ---------- Перебор ----------
     def solve_all(
             self,
             progress_cb: Optional[Callable[[int, int], None]] = None,
             cancel_cb: Optional[Callable[[], bool]] = None,
+            result_cb: Optional[Callable[[List[int], List[int], List[int]], None]] = None,
     ) -> Tuple[List[int], List[int], List[int]]:
+        """
+        Списки S для задач 19, 20, 21.
+        - result_cb(новые_19, новые_20, новые_21) получает S по мере классификации
+          (при отмене уже переданное остаётся у вызывающего)
+        - при исчерпании бюджета возвращаются S, классифицированные до этого момента
+        """
+        t0 = time.perf_counter()
         s_list_19: List[int] = []
         s_list_20: List[int] = []
         s_list_21: List[int] = []
+        with self._guarded(cancel_cb):
+            self._solve_range(s_list_19, s_list_20, s_list_21, progress_cb, result_cb)
+        self.stats.add_time("solve", time.perf_counter() - t0)
+        return s_list_19, s_list_20, s_list_21
 
+    def _solve_range(
+            self,
+            s_list_19: List[int],
+            s_list_20: List[int],
+            s_list_21: List[int],
+            progress_cb: Optional[Callable[[int, int], None]],
+            result_cb: Optional[Callable[[List[int], List[int], List[int]], None]],
+    ) -> None:
         total = self.s_max - self.s_min + 1
         for idx, S in enumerate(range(self.s_min, self.s_max + 1), start=1):
-            if cancel_cb and cancel_cb():
+            if self._interrupted():
                 raise RuntimeError("CANCELLED")
             if progress_cb:
                 progress_cb(idx, total)
 
             start = self._start_from_S(S)
+            n19, n20, n21 = len(s_list_19), len(s_list_20), len(s_list_21)
 
             # 19: Петя не выигрывает за 1; для любого хода Пети Ваня выигрывает за 1
             w1_petya = self._has_move_to_terminal(start)
@@ -254,4 +456,118 @@ class EGESolver:
             if ok_21:
                 s_list_21.append(S)
 
-        return s_list_19, s_list_20, s_list_21
+            self._note_sizes()
+            if result_cb and (len(s_list_19) > n19 or len(s_list_20) > n20 or len(s_list_21) > n21):
+                result_cb(s_list_19[n19:], s_list_20[n20:], s_list_21[n21:])
+
+    def start_outcomes(
+            self,
+            max_moves: Optional[int],
+            progress_cb: Optional[Callable[[int, int], None]] = None,
+            cancel_cb: Optional[Callable[[], bool]] = None,
+    ) -> List[Tuple[int, int, int]]:
+        """
+        Для каждого S — (S, метка, расстояние) стартовой позиции (ходит Петя), определённые
+        на max_moves собственных ходов победителя вперёд; не решённые за это время — (S, UNKNOWN, 0).
+        Перебор всегда ограничен: max_moves=None (ничьи и исходы любой длины) — только у RetroSolver.
+        При исчерпании бюджета список обрывается на последнем решённом S.
+        """
+        if max_moves is None:
+            raise ValueError("Для вопросов без ограничения числа ходов нужен RetroSolver")
+        t0 = time.perf_counter()
+        res: List[Tuple[int, int, int]] = []
+        total = self.s_max - self.s_min + 1
+        with self._guarded(cancel_cb):
+            for idx, S in enumerate(range(self.s_min, self.s_max + 1), start=1):
+                if self._interrupted():
+                    raise RuntimeError("CANCELLED")
+                if progress_cb:
+                    progress_cb(idx, total)
+                label, dist = self._outcome_within(self._start_from_S(S), 2 * max_moves)
+                res.append((S, label, dist))
+                self._note_sizes()
+        self.stats.add_time("solve", time.perf_counter() - t0)
+        return res
+
+    def solve_queries(
+            self,
+            queries: Sequence[TaskQuery],
+            progress_cb: Optional[Callable[[int, int], None]] = None,
+            cancel_cb: Optional[Callable[[], bool]] = None,
+    ) -> List[List[int]]:
+        """Списки подходящих S для каждого вопроса — за один проход по диапазону S (бюджет — как у start_outcomes)."""
+        if not queries:
+            return []
+        outcomes = self.start_outcomes(max(q.horizon for q in queries), progress_cb, cancel_cb)
+        return [[S for S, label, dist in outcomes if q.matches(label, dist)] for q in queries]
+
+    # ---------- Статистика ----------
+    def _caches(self) -> Dict[str, Dict]:
+        return dict(moves=self._moves_cache, w1=self._w1_cache, can=self._can_cache, outcome=self._outcome_cache)
+
+    def _note_sizes(self) -> None:
+        """
+        Отметить размеры кэшей в stats.peak — после каждого S. Без ограничения памяти кэши только растут,
+        и этого достаточно; с ограничением пик перед сменой поколения отмечает сам Memo (on_rotate).
+        """
+        note = self.stats.note_size
+        for name, cache in self._caches().items():
+            note(name, len(cache))
+
+    def stats_report(self) -> Dict[str, Any]:
+        """
+        Счётчики и замеры в виде словаря (для JSON): SolverStats плюс текущие размеры кэшей
+        и приблизительная память под них. При profile=True в times есть и 'search' — время
+        решения без генерации ходов и проверок терминала.
+        """
+        self._note_sizes()
+        caches = self._caches()
+        res = self.stats.to_dict()
+        res["status"] = self.status
+        res["cache_sizes"] = {name: len(cache) for name, cache in caches.items()}
+        res["memory_bytes"] = {name: approx_bytes(cache) for name, cache in caches.items()}
+        if self._memos:
+            for name, memo in self._memos.items():
+                res["memory_bytes"][name] += approx_bytes(memo.old) + memo.nbytes
+            res["cache_rotations"] = {name: memo.rotations for name, memo in self._memos.items()}
+            res["spilled"] = {name: len(memo.bits) for name, memo in self._memos.items() if memo.bits is not None}
+        times = res["times"]
+        if self.stats.timed and "solve" in times:
+            times["search"] = max(0.0, times["solve"] - times.get("moves", 0.0) - times.get("terminal", 0.0))
+        return res
+
+    def _solver_kwargs(self) -> Dict[str, Any]:
+        """Параметры конструктора (кроме правил, шаблона и диапазона) для копий solver в других процессах."""
+        return dict(profile=self.stats.timed, budget=self._shard_budget(), cache_policy=self.cache_policy)
+
+    def _shard_budget(self) -> Optional[Budget]:
+        # Срок отсчитывается один раз — при запуске параллельного расчёта
+        return self.budget.started() if self.budget is not None else None
+
+    def solve_all_parallel(
+            self,
+            workers: Optional[int] = None,
+            progress_cb: Optional[Callable[[int, int], None]] = None,
+            cancel_cb: Optional[Callable[[], bool]] = None,
+            result_cb: Optional[Callable[[List[int], List[int], List[int]], None]] = None,
+    ) -> Tuple[List[int], List[int], List[int]]:
+        """
+        То же, что solve_all, но диапазон S делится на шарды, которые решаются в пуле процессов.
+        Срок бюджета у шардов общий, лимит позиций — на каждый шард; status — BUDGET_EXCEEDED,
+        если бюджет кончился хотя бы у одного шарда.
+        """
+        self.status = None
+        try:
+            lists, statuses = solve_parallel(type(self), self.rules, self.start_tmpl, self.s_min, self.s_max,
+                                             solver_kwargs=self._solver_kwargs(), workers=workers,
+                                             progress_cb=progress_cb, cancel_cb=cancel_cb, result_cb=result_cb)
+        except RuntimeError as e:
+            if str(e) == "CANCELLED":
+                self.status = CANCELLED
+            raise
+        self.status = BUDGET_EXCEEDED if BUDGET_EXCEEDED in statuses else DONE
+        return lists
+
+
+def _absent(key: Any) -> None:
+    return None
@@ -0,0 +1,206 @@
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from .game import Game
+
+try:
+    import numpy as np
+except ImportError:  # numpy нужен только табличным движкам
+    np = None
+
+
+def require_numpy() -> None:
+    if np is None:
+        raise ImportError("Для табличного движка нужен numpy (pip install numpy)")
+
+
+# Ключи позиций — int64; запас до 2**63 нужен, чтобы сумма (col - lo) * stride не переполнялась
+MAX_INDEX = 2 ** 62
+
+
+class StateIndex:
+    """
+    Плотная нумерация позиций N-кучевых игр внутри прямоугольника lo[i] <= h_i <= hi[i]
+    (смешанная система счисления, старшая куча — первая):
+      (h1, ..., hN) -> sum((h_i - lo_i) * stride_i),  stride_i = w_{i+1} * ... * w_N,  w_i = hi_i - lo_i + 1
+    Позиции вне прямоугольника получают индекс -1.
+    """
+
+    def __init__(self, lo: Tuple[int, ...], hi: Tuple[int, ...]):
+        if not lo or len(lo) != len(hi):
+            raise ValueError("Границы StateIndex должны быть непустыми и одной длины")
+        if any(l > h for l, h in zip(lo, hi)):
+            raise ValueError("Пустой диапазон значений кучи")
+        self.lo = tuple(lo)
+        self.hi = tuple(hi)
+        self.widths = tuple(h - l + 1 for l, h in zip(lo, hi))
+        strides = [1] * len(lo)
+        for i in range(len(lo) - 2, -1, -1):
+            strides[i] = strides[i + 1] * self.widths[i + 1]
+        self.strides = tuple(strides)
+        self.size = self.widths[0] * self.strides[0]
+        if self.size >= MAX_INDEX:
+            raise ValueError("Прямоугольник позиций слишком велик для 64-битных ключей")
+
+    @property
+    def heaps(self) -> int:
+        return len(self.lo)
+
+    def contains(self, state: Tuple[int, ...]) -> bool:
+        return all(l <= v <= h for v, l, h in zip(state, self.lo, self.hi))
+
+    def encode(self, state: Tuple[int, ...]) -> int:
+        if len(state) != len(self.lo) or not self.contains(state):
+            return -1
+        return sum((v - l) * s for v, l, s in zip(state, self.lo, self.strides))
+
+    def decode(self, idx: int) -> Tuple[int, ...]:
+        res = []
+        for l, s in zip(self.lo, self.strides):
+            q, idx = divmod(idx, s)
+            res.append(l + q)
+        return tuple(res)
+
+    def encode_columns(self, cols: List["np.ndarray"]) -> "np.ndarray":
+        """Векторный encode: по массиву значений каждой кучи — массив индексов (-1 вне прямоугольника)."""
+        require_numpy()
+        idx = np.zeros(np.shape(cols[0]), dtype=np.int64)
+        inside = np.ones(np.shape(cols[0]), dtype=bool)
+        for col, l, h, s in zip(cols, self.lo, self.hi, self.strides):
+            col = np.asarray(col, dtype=np.int64)
+            inside &= (col >= l) & (col <= h)
+            idx += (col - l) * s
+        return np.where(inside, idx, -1)
+
+    def columns(self, start: int = 0, stop: Optional[int] = None) -> List["np.ndarray"]:
+        """Значения каждой кучи для индексов start..stop-1 (по умолчанию — всех) подряд (векторный decode)."""
+        require_numpy()
+        idx = np.arange(start, self.size if stop is None else min(stop, self.size), dtype=np.int64)
+        res = []
+        for l, s in zip(self.lo, self.strides):
+            q, idx = np.divmod(idx, s)
+            res.append(q + l)
+        return res
+
+    @classmethod
+    def for_region(cls, game: Game, starts: Iterable[Tuple[int, ...]],
+                   max_depth: Optional[int] = None, max_states: Optional[int] = 50_000_000,
+                   cancel_cb: Optional[Callable[[], bool]] = None) -> "StateIndex":
+        """
+        Прямоугольник, покрывающий все позиции, достижимые из starts (не глубже max_depth полуходов).
+        Считается интервальной арифметикой по каждой куче: из интервала раскрывается только та часть,
+        где позиция может быть нетерминальной при крайних значениях остальных куч
+        (для 'ge' — минимальных, для 'lt' — максимальных); старты раскрываются всегда.
+        max_states ограничивает размер прямоугольника (None — без ограничения, только вместе с max_depth).
+        Без max_depth сначала проверяется, что множество позиций конечно (_endless_heap): иначе
+        прямоугольник рос бы до max_states шаг за шагом.
+        cancel_cb опрашивается на каждом шаге роста (как между слоями в MoveGraph.build).
+        """
+        starts = list(starts)
+        if not starts:
+            raise ValueError("Нет стартовых позиций")
+        if max_depth is None:
+            endless = _endless_heap(game, starts)
+            if endless is not None:
+                raise ValueError(
+                    f"Куча {endless + 1} может меняться без конца, не заканчивая игру: "
+                    f"множество позиций бесконечно — задайте max_depth"
+                )
+        n = len(starts[0])
+        lo = [min(st[i] for st in starts) for i in range(n)]
+        hi = [max(st[i] for st in starts) for i in range(n)]
+
+        def size(lo_, hi_) -> int:
+            res = 1
+            for l, h in zip(lo_, hi_):
+                res *= h - l + 1
+            return res
+
+        step = 0
+        while max_depth is None or step < max_depth:
+            if cancel_cb and cancel_cb():
+                raise RuntimeError("CANCELLED")
+            new_lo, new_hi = list(lo), list(hi)
+            for i in range(n):
+                if step == 0:
+                    elo, ehi = lo[i], hi[i]
+                else:
+                    span = _expandable_span(game, i, lo, hi)
+                    if span is None:
+                        continue
+                    elo, ehi = span
+                for act in game.actions:
+                    # все действия монотонно неубывающие: +a, ×m (m >= 2), ÷d (d >= 2)
+                    a, b = act.apply(elo), act.apply(ehi)
+                    new_lo[i] = min(new_lo[i], a, b)
+                    new_hi[i] = max(new_hi[i], a, b)
+            step += 1
+            if new_lo == lo and new_hi == hi:
+                break
+            lo, hi = new_lo, new_hi
+            if max_states is not None and size(lo, hi) > max_states:
+                raise ValueError(
+                    f"Множество позиций больше {max_states} — задайте max_depth или уменьшите диапазон"
+                )
+        return cls(tuple(lo), tuple(hi))
+
+
+def _expandable_span(game: Game, i: int, lo: List[int], hi: List[int]) -> Optional[Tuple[int, int]]:
+    """
+    Часть [lo[i]; hi[i]], где куча i может стоять в нетерминальной позиции.
+    Значение цели монотонно по каждой куче, поэтому это подынтервал (или пусто).
+    """
+    ge = game.rules.finish_cmp == "ge"
+    others = list(lo if ge else hi)
+
+    def open_at(v: int) -> bool:
+        others[i] = v
+        return not game.is_terminal(tuple(others))
+
+    a, b = lo[i], hi[i]
+    if ge:  # нетерминальные значения — префикс интервала
+        if not open_at(a):
+            return None
+        while a < b:
+            mid = (a + b + 1) // 2
+            if open_at(mid):
+                a = mid
+            else:
+                b = mid - 1
+        return lo[i], a
+    else:  # нетерминальные значения — суффикс интервала
+        if not open_at(b):
+            return None
+        while a < b:
+            mid = (a + b) // 2
+            if open_at(mid):
+                b = mid
+            else:
+                a = mid + 1
+        return b, hi[i]
+
+
+# Стартов, на которых _endless_heap ищет бесконечную цепочку ходов (первые и последние)
+ENDLESS_PROBES = 64
+
+
+def _endless_heap(game: Game, starts: List[Tuple[int, ...]]) -> Optional[int]:
+    """
+    Куча, которую одно и то же действие уводит от старта сколь угодно далеко по нетерминальным позициям,
+    или None. +a (a != 0) и ×m (для ненулевой кучи) двигают значение в одну сторону без конца; ÷d — нет.
+    Терминальность монотонна по каждой куче, поэтому если нетерминальны позиция после первого хода
+    и позиция с кучей у края int64 в ту же сторону, нетерминальна и вся цепочка между ними.
+    """
+    probes = starts if len(starts) <= 2 * ENDLESS_PROBES else starts[:ENDLESS_PROBES] + starts[-ENDLESS_PROBES:]
+    for i in range(len(starts[0])):
+        for act in game.actions:
+            if act.kind == "div":
+                continue
+            for st in probes:
+                first = act.apply(st[i])
+                if first == st[i]:
+                    continue
+                far = MAX_INDEX if first > st[i] else -MAX_INDEX
+                if not game.is_terminal(st[:i] + (first,) + st[i + 1:]) \
+                        and not game.is_terminal(st[:i] + (far,) + st[i + 1:]):
+                    return i
+    return None
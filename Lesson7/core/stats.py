@@ -0,0 +1,71 @@
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterator, Optional
+
+# Кэши EGESolver, по которым ведутся счётчики попаданий
+CACHES = ("moves", "w1", "can", "outcome")
+
+
+@dataclass
+class SolverStats:
+    """
+    Счётчики работы solver'а.
+    - states_generated: позиций выдано генератором ходов (Game.iter_moves, или вершин графа у RetroSolver)
+    - terminal_checks: вызовов Game.is_terminal
+    - hits/misses: попадания и промахи кэшей EGESolver (ключи — CACHES)
+    - peak: наибольший замеченный размер каждого кэша (отмечается после каждого S и при смене
+      поколения Memo — тогда вместе со старым поколением)
+    - times: секунды по фазам; 'moves' и 'terminal' меряются только при timed=True
+      (perf_counter на каждый вызов заметно дороже самой проверки), остальные — всегда
+    """
+    states_generated: int = 0
+    terminal_checks: int = 0
+    hits: Dict[str, int] = field(default_factory=lambda: {k: 0 for k in CACHES})
+    misses: Dict[str, int] = field(default_factory=lambda: {k: 0 for k in CACHES})
+    peak: Dict[str, int] = field(default_factory=lambda: {k: 0 for k in CACHES})
+    times: Dict[str, float] = field(default_factory=dict)
+    timed: bool = False
+
+    def add_time(self, phase: str, seconds: float) -> None:
+        self.times[phase] = self.times.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - t0)
+
+    def note_size(self, cache: str, size: int) -> None:
+        if size > self.peak[cache]:
+            self.peak[cache] = size
+
+    def hit_rate(self, cache: str) -> Optional[float]:
+        total = self.hits[cache] + self.misses[cache]
+        return self.hits[cache] / total if total else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        res = asdict(self)
+        res["hit_rate"] = {k: self.hit_rate(k) for k in CACHES}
+        return res
+
+
+def approx_bytes(obj: Any) -> int:
+    """Грубая оценка памяти кэша: сам контейнер, ключи и значения (кортежи — вместе с элементами)."""
+    if hasattr(obj, "nbytes"):
+        return int(obj.nbytes)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            size += _tuple_bytes(k) + _tuple_bytes(v)
+    return size
+
+
+def _tuple_bytes(x: Any) -> int:
+    if isinstance(x, tuple):
+        # Маленькие int кэшируются интерпретатором, но для оценки считаем их отдельными объектами
+        return sys.getsizeof(x) + sum(_tuple_bytes(y) for y in x)
+    return sys.getsizeof(x)
@@ -0,0 +1,149 @@
+import json
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from .cache import normalized_rules
+
+if TYPE_CHECKING:
+    from .solver import EGESolver
+
+FORMAT_VERSION = 1
+
+# Роли вершин стратегии
+WINNER = "W"  # ходит победитель: один выбранный ход
+LOSER = "L"   # ходит проигрывающий: все его ходы
+FINAL = "T"   # терминальная позиция после победного хода
+
+
+@dataclass
+class StrategyNode:
+    state: Tuple[int, ...]
+    role: str
+    moves: int  # сколько ходов ещё нужно победителю (0 — уже выиграл)
+    children: List[int] = field(default_factory=list)
+
+
+class StrategyDAG:
+    """
+    Полная выигрышная стратегия как DAG: у победителя — один выбранный ход (самый быстрый),
+    у проигрывающего — все ходы. Одна позиция с одной ролью — одна вершина, даже если
+    в неё ведут разные ветки (транспозиции), поэтому размер не растёт экспоненциально с глубиной.
+    """
+
+    def __init__(self, task: int, S: int, rules: Dict[str, Any], nodes: List[StrategyNode], root: int):
+        self.task = task
+        self.S = S
+        self.rules = rules
+        self.nodes = nodes
+        self.root = root
+
+    @property
+    def edges(self) -> int:
+        return sum(len(n.children) for n in self.nodes)
+
+    def tree_size(self) -> int:
+        """Число вершин, если развернуть DAG в обычное дерево."""
+        size: List[int] = [0] * len(self.nodes)
+        for v in range(len(self.nodes)):  # дети всегда создаются раньше родителя
+            size[v] = 1 + sum(size[c] for c in self.nodes[v].children)
+        return size[self.root]
+
+    # ---------- Сериализация ----------
+    def to_dict(self) -> Dict[str, Any]:
+        """Компактный вид: вершина — [состояние, роль, ходов до победы, [дети]]."""
+        return dict(
+            version=FORMAT_VERSION, task=self.task, S=self.S, rules=self.rules, root=self.root,
+            nodes=[[list(n.state), n.role, n.moves, n.children] for n in self.nodes],
+        )
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "StrategyDAG":
+        if data.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия формата стратегии: {data.get('version')}")
+        nodes = [StrategyNode(tuple(st), role, moves, list(ch)) for st, role, moves, ch in data["nodes"]]
+        return cls(data["task"], data["S"], data["rules"], nodes, data["root"])
+
+
+class _Builder:
+    def __init__(self, solver: "EGESolver"):
+        self.solver = solver
+        self.game = solver.game
+        self.nodes: List[StrategyNode] = []
+        self.index: Dict[Tuple[str, Tuple[int, ...]], int] = {}
+
+    def _add(self, node: StrategyNode) -> int:
+        self.nodes.append(node)
+        self.index[(node.role, node.state)] = len(self.nodes) - 1
+        return len(self.nodes) - 1
+
+    def win_distance(self, state: Tuple[int, ...], limit: int) -> Optional[int]:
+        for j in range(1, limit + 1):
+            if self.solver._can_win_in(state, j):
+                return j
+        return None
+
+    def winner(self, state: Tuple[int, ...], limit: int) -> Optional[int]:
+        """Вершина победителя: ход, выигрывающий быстрее всего (не дольше limit ходов)."""
+        v = self.index.get((WINNER, state))
+        if v is not None:
+            return v if self.nodes[v].moves <= limit else None
+        d = self.win_distance(state, limit)
+        if d is None:
+            return None
+        for s1 in self.solver._moves(state):
+            if self.game.is_terminal(s1):
+                child = self.index.get((FINAL, s1))
+                if child is None:
+                    child = self._add(StrategyNode(s1, FINAL, 0))
+                return self._add(StrategyNode(state, WINNER, 1, [child]))
+            if d > 1 or not self.solver._moves(s1):
+                child = self.loser(s1, d - 1)
+                if child is not None:
+                    return self._add(StrategyNode(state, WINNER, d, [child]))
+        return None
+
+    def loser(self, state: Tuple[int, ...], limit: int) -> Optional[int]:
+        """Вершина проигрывающего: все его ходы, после каждого победитель выигрывает не дольше limit ходов."""
+        v = self.index.get((LOSER, state))
+        if v is not None:
+            return v if self.nodes[v].moves <= limit else None
+        children = []
+        need = 0
+        for s2 in self.solver._moves(state):
+            if self.game.is_terminal(s2):
+                return None  # проигрывающий сам заканчивает игру
+            child = self.winner(s2, limit)
+            if child is None:
+                return None
+            children.append(child)
+            need = max(need, self.nodes[child].moves)
+        return self._add(StrategyNode(state, LOSER, need, children))
+
+
+def build_strategy(solver: "EGESolver", task: int, S: int) -> Optional[StrategyDAG]:
+    """
+    Полная стратегия для задачи 19/20/21 и старта S или None, если S под задачу не подходит.
+    - 19: ходит Петя (проигрывающий), после любого его хода Ваня выигрывает первым ходом
+    - 20: Петя выигрывает ровно вторым ходом
+    - 21: Ваня выигрывает не позже второго хода при любой игре Пети, но не всегда первым
+    """
+    if task not in (19, 20, 21):
+        raise ValueError("task должен быть 19, 20 или 21")
+    start = solver._start_from_S(S)
+    b = _Builder(solver)
+    if task == 20:
+        if solver._has_move_to_terminal(start):
+            return None
+        root = b.winner(start, 2)
+        if root is None or b.nodes[root].moves != 2:
+            return None
+    else:
+        root = b.loser(start, 1 if task == 19 else 2)
+        if root is None or not b.nodes[root].children:
+            return None
+        if task == 21 and b.nodes[root].moves != 2:
+            return None
+    return StrategyDAG(task, S, normalized_rules(solver.rules), b.nodes, root)
@@ -0,0 +1,52 @@
+from dataclasses import dataclass
+
+# Метки позиций (с точки зрения игрока, который сейчас ходит)
+UNKNOWN = 0  # исход не определён (не решается в пределах просмотра или за горизонтом)
+WIN = 1      # ходящий выигрывает
+LOSE = 2     # ходящий проигрывает
+DRAW = 3     # ничья: при правильной игре партия бесконечна (цикл), известно только по полному графу
+
+PETYA_WINS = "petya_wins"
+VANYA_WINS = "vanya_wins"
+MIN_LENGTH = "min_length"
+
+
+@dataclass(frozen=True)
+class TaskQuery:
+    """
+    Вопрос о стартовой позиции (первым ходит Петя).
+    - 'petya_wins': Петя выигрывает не позже своего k-го хода при любой игре Вани
+    - 'vanya_wins': Ваня выигрывает не позже своего k-го хода при любой игре Пети
+    - 'min_length': при правильной игре обоих партия длится не менее k ходов (считая ходы обоих)
+    exact=True для 'petya_wins'/'vanya_wins' — ровно k-м ходом, и не раньше.
+    Задачи 19/20/21 — это ('vanya_wins', 1, exact), ('petya_wins', 2, exact), ('vanya_wins', 2, exact).
+    """
+    kind: str
+    k: int
+    exact: bool = False
+
+    def __post_init__(self):
+        if self.kind not in (PETYA_WINS, VANYA_WINS, MIN_LENGTH):
+            raise ValueError(f"Неизвестный вид вопроса: {self.kind}")
+        if self.k < 1:
+            raise ValueError("k должно быть не меньше 1")
+
+    @property
+    def horizon(self) -> int:
+        """Сколько собственных ходов победителя нужно просмотреть, чтобы ответить на вопрос."""
+        return self.k if self.kind != MIN_LENGTH else (self.k + 1) // 2
+
+    def matches(self, label: int, dist: int) -> bool:
+        """
+        label/dist — исход старта, определённый не хуже чем на horizon собственных ходов
+        (UNKNOWN — партия не решается за это число ходов).
+        """
+        if self.kind == PETYA_WINS:
+            return label == WIN and (dist == self.k if self.exact else dist <= self.k)
+        if self.kind == VANYA_WINS:
+            return label == LOSE and (dist == self.k if self.exact else 1 <= dist <= self.k)
+        if label == WIN:
+            return 2 * dist - 1 >= self.k
+        if label == LOSE:
+            return 2 * dist >= self.k
+        return True  # не решается за horizon ходов (или ничья) — значит, длится дольше
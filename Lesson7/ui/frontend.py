@@ -1,3 +1,4 @@
+import os
 import sys
 import time
 import json
@@ -6,8 +7,19 @@ import re
 from typing import List, Optional, Tuple, Dict
 from PyQt6 import QtWidgets, QtCore, QtGui
 
+from core.cache import SolutionCache
+from core.outcome_map import write_heatmap_png, write_outcome_npy
+from core.retro import RetroSolver, TASKS_DEPTH
 from core.rules import GameRules
+from core.session import SolverSession
 from core.solver import EGESolver
+from core.states import np
+from core.strategy import FINAL, StrategyDAG
+
+# Сколько наборов правил держать живыми между пересчётами
+SESSION_SIZE = 4
+# Как часто (сек) рабочий поток отправляет в UI прогресс и новые S — не чаще, чтобы сигналы не тормозили расчёт
+STREAM_INTERVAL = 0.2
 
 
 def compress_ranges(nums: List[int]) -> str:
@@ -149,41 +161,85 @@ class IntListEditor(QtWidgets.QWidget):
         self.valuesChanged.emit()
 
 
+def make_solver(rules: GameRules, start_template, s_min: int, s_max: int, profile: bool = False) -> EGESolver:
+    """Табличный движок с дисковым кэшем, если есть numpy, иначе — обычный перебор."""
+    if np is None:
+        return EGESolver(rules, start_template, s_min, s_max, profile=profile)
+    root = QtCore.QStandardPaths.writableLocation(QtCore.QStandardPaths.StandardLocation.CacheLocation)
+    cache = SolutionCache(os.path.join(root, "solutions") if root else None)
+    return RetroSolver(rules, start_template, s_min, s_max, max_depth=TASKS_DEPTH, cache=cache, profile=profile)
+
+
 class SolveWorker(QtCore.QObject):
     started = QtCore.pyqtSignal()
     progress = QtCore.pyqtSignal(int, int)
+    partial = QtCore.pyqtSignal(list, list, list)  # новые S для 19/20/21, пачками раз в STREAM_INTERVAL
     finished = QtCore.pyqtSignal(list, list, list, float, object)
     error = QtCore.pyqtSignal(str)
 
-    def __init__(self, rules: GameRules, start_template, s_min: int, s_max: int, parent=None):
+    def __init__(self, session: SolverSession, rules: GameRules, start_template, s_min: int, s_max: int,
+                 workers: int = 1, parent=None):
         super().__init__(parent)
+        self.session = session
         self.rules = rules
         self.start_template = start_template
         self.s_min = s_min
         self.s_max = s_max
+        self.workers = workers
         self._cancelled = False
+        self._unsent: Tuple[List[int], List[int], List[int]] = ([], [], [])
+        self._last_emit = 0.0
 
     @QtCore.pyqtSlot()
     def cancel(self):
         self._cancelled = True
 
+    def _on_result(self, s19: List[int], s20: List[int], s21: List[int]):
+        for unsent, new in zip(self._unsent, (s19, s20, s21)):
+            unsent.extend(new)
+
+    def _flush(self):
+        if any(self._unsent):
+            self.partial.emit(*(list(x) for x in self._unsent))
+            for x in self._unsent:
+                x.clear()
+
     @QtCore.pyqtSlot()
     def run(self):
         try:
             self.started.emit()
-            solver = EGESolver(self.rules, self.start_template, self.s_min, self.s_max)
+            range_total = self.s_max - self.s_min + 1
+            # Проверено S диапазона: растёт только по progress_cb (сессия считает лишь новые S — до первого
+            # вызова неизвестно, сколько их), так что при отмене в meta и на полосе — реальный охват
+            done = [0]
 
             def cb_progress(i: int, total: int):
-                self.progress.emit(i, total)
+                done[0] = range_total - total + i
+                now = time.perf_counter()
+                if i == total or now - self._last_emit >= STREAM_INTERVAL:
+                    self._last_emit = now
+                    self.progress.emit(done[0], range_total)
+                    self._flush()
 
             def cb_cancel() -> bool:
                 return self._cancelled
 
             t0 = time.perf_counter()
-            s19, s20, s21 = solver.solve_all(progress_cb=cb_progress, cancel_cb=cb_cancel)
+            cancelled = False
+            try:
+                s19, s20, s21 = self.session.solve_all(
+                    self.rules, self.start_template, self.s_min, self.s_max, workers=self.workers,
+                    progress_cb=cb_progress, cancel_cb=cb_cancel, result_cb=self._on_result,
+                )
+                done[0] = range_total  # в том числе если новых S не было и progress_cb не вызывался
+            except RuntimeError:
+                if not self._cancelled:
+                    raise
+                # Отмена: оставляем то, что успели классифицировать (сессия помнит и это)
+                cancelled = True
+                s19, s20, s21 = self.session.results(self.rules, self.start_template, self.s_min, self.s_max)
             dt = time.perf_counter() - t0
-            if self._cancelled:
-                raise RuntimeError("Расчёт отменён пользователем")
+            solver = self.session.solver(self.rules, self.start_template)
 
             meta = dict(
                 rules=dict(
@@ -199,13 +255,89 @@ class SolveWorker(QtCore.QObject):
                 start_template=self.start_template,
                 s_min=self.s_min,
                 s_max=self.s_max,
+                workers=self.workers,
                 elapsed=dt,
+                cancelled=cancelled,
+                done=done[0],
+                # Накоплено живым solver'ом сессии; при workers > 1 — только работа этого процесса
+                stats=solver.stats_report() if solver is not None else {},
             )
             self.finished.emit(s19, s20, s21, dt, meta)
         except Exception as e:
             self.error.emit(str(e))
 
 
+class StrategyTreeDialog(QtWidgets.QDialog):
+    """Полная стратегия (DAG) деревом; ветви разворачиваются только при раскрытии."""
+
+    PLAYERS = ("Петя", "Ваня")
+
+    def __init__(self, dag: StrategyDAG, solver: EGESolver, parent=None):
+        super().__init__(parent)
+        self.dag = dag
+        self.solver = solver
+        self.setWindowTitle(f"Стратегия: задание {dag.task}, S = {dag.S}")
+        self.resize(760, 620)
+
+        lay = QtWidgets.QVBoxLayout(self)
+        info = QtWidgets.QLabel(
+            f"Позиций в стратегии: {len(dag.nodes)} (ветвей: {dag.edges}); "
+            f"в виде обычного дерева было бы {dag.tree_size()}"
+        )
+        info.setObjectName("hint")
+        lay.addWidget(info)
+
+        self.tree = QtWidgets.QTreeWidget()
+        self.tree.setHeaderHidden(True)
+        self.tree.itemExpanded.connect(self._on_expand)
+        lay.addWidget(self.tree, 1)
+
+        buttons = QtWidgets.QDialogButtonBox()
+        btn_save = buttons.addButton("Сохранить JSON…", QtWidgets.QDialogButtonBox.ButtonRole.ActionRole)
+        buttons.addButton(QtWidgets.QDialogButtonBox.StandardButton.Close)
+        btn_save.clicked.connect(self._save)
+        buttons.rejected.connect(self.reject)
+        lay.addWidget(buttons)
+
+        root = dag.nodes[dag.root]
+        item = QtWidgets.QTreeWidgetItem([f"Старт: {solver.fmt_state(root.state)}"])
+        self._attach(item, dag.root, 0)
+        self.tree.addTopLevelItem(item)
+        item.setExpanded(True)
+
+    def _attach(self, item: QtWidgets.QTreeWidgetItem, node: int, ply: int):
+        item.setData(0, QtCore.Qt.ItemDataRole.UserRole, (node, ply))
+        if self.dag.nodes[node].children:
+            item.addChild(QtWidgets.QTreeWidgetItem(["…"]))  # заглушка до раскрытия
+
+    def _on_expand(self, item: QtWidgets.QTreeWidgetItem):
+        data = item.data(0, QtCore.Qt.ItemDataRole.UserRole)
+        if data is None or item.childCount() != 1 or item.child(0).data(0, QtCore.Qt.ItemDataRole.UserRole):
+            return
+        node, ply = data
+        item.takeChild(0)
+        parent = self.dag.nodes[node]
+        for c in parent.children:
+            child = self.dag.nodes[c]
+            text = (f"{self.PLAYERS[ply % 2]}: {self.solver.describe_move(parent.state, child.state)} "
+                    f"→ {self.solver.fmt_state(child.state)}")
+            if child.role == FINAL:
+                text += " (терминал)"
+            elif child.moves:
+                text += f"  [победа не позже чем за {child.moves} ход(а)]"
+            sub = QtWidgets.QTreeWidgetItem([text])
+            self._attach(sub, c, ply + 1)
+            item.addChild(sub)
+
+    def _save(self):
+        fname, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, "Сохранить стратегию", f"strategy_{self.dag.task}_{self.dag.S}.json", "JSON (*.json)"
+        )
+        if fname:
+            with open(fname, "w", encoding="utf-8") as f:
+                f.write(self.dag.to_json())
+
+
 class MainWindow(QtWidgets.QMainWindow):
     def __init__(self):
         super().__init__()
@@ -214,6 +346,12 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self._last_results: Dict[int, List[int]] = {19: [], 20: [], 21: []}
         self._last_meta: Dict[str, object] = {}
+        self._live: Dict[int, List[int]] = {19: [], 20: [], 21: []}  # S, пришедшие во время расчёта
+        self._profile = False
+        self._session = SolverSession(
+            lambda rules, tmpl, s_min, s_max: make_solver(rules, tmpl, s_min, s_max, profile=self._profile),
+            max_entries=SESSION_SIZE,
+        )
 
         central = QtWidgets.QWidget()
         self.setCentralWidget(central)
@@ -414,6 +552,20 @@ class MainWindow(QtWidgets.QMainWindow):
         start_l.addLayout(g)
         left_l.addWidget(start_card)
 
+        calc_card, calc_l = self._card("Вычисления")
+        calc_form = QtWidgets.QFormLayout()
+        calc_form.setHorizontalSpacing(10)
+        self.sp_workers = QtWidgets.QSpinBox()
+        self.sp_workers.setRange(1, os.cpu_count() or 1)
+        self.sp_workers.setValue(1)
+        self.sp_workers.setToolTip("Сколько процессов делят между собой диапазон S (1 — считать в одном потоке)")
+        calc_form.addRow("Процессов:", self.sp_workers)
+        self.chk_profile = QtWidgets.QCheckBox("Замерять время фаз")
+        self.chk_profile.setToolTip("Время генерации ходов и проверок терминала попадёт в JSON-экспорт (расчёт чуть медленнее)")
+        calc_form.addRow("", self.chk_profile)
+        calc_l.addLayout(calc_form)
+        left_l.addWidget(calc_card)
+
         self.rb_one.toggled.connect(self._on_heaps_change)
         self.cb_goal_mode.currentTextChanged.connect(self._on_goal_mode_change)
 
@@ -444,6 +596,11 @@ class MainWindow(QtWidgets.QMainWindow):
         self.btn_export_csv.setText("Экспорт CSV")
         self.btn_export_csv.setObjectName("ghostBtn")
 
+        self.btn_export_map = QtWidgets.QToolButton()
+        self.btn_export_map.setText("Карта исходов")
+        self.btn_export_map.setToolTip("Исход каждой позиции рассчитанной области: NPY и PNG-превью")
+        self.btn_export_map.setObjectName("ghostBtn")
+
         self.btn_reset = QtWidgets.QToolButton()
         self.btn_reset.setText("Сброс")
         self.btn_reset.setObjectName("dangerBtn")
@@ -454,6 +611,7 @@ class MainWindow(QtWidgets.QMainWindow):
         al.addWidget(self.btn_copy_all)
         al.addWidget(self.btn_export_json)
         al.addWidget(self.btn_export_csv)
+        al.addWidget(self.btn_export_map)
         al.addStretch(1)
         al.addWidget(self.btn_reset)
 
@@ -554,11 +712,15 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.btn_show_strat = QtWidgets.QPushButton("Показать")
         self.btn_show_strat.setObjectName("primarySmall")
+        self.btn_tree_strat = QtWidgets.QPushButton("Полное дерево…")
+        self.btn_tree_strat.setObjectName("primarySmall")
+        self.btn_tree_strat.setToolTip("Вся выигрышная стратегия: выбранный ход победителя и все ответы соперника")
         self.btn_copy_strat = QtWidgets.QToolButton()
         self.btn_copy_strat.setText("Копировать")
         self.btn_copy_strat.setObjectName("ghostSmall")
         cl.addStretch(1)
         cl.addWidget(self.btn_show_strat)
+        cl.addWidget(self.btn_tree_strat)
         cl.addWidget(self.btn_copy_strat)
 
         strat_layout.addWidget(controls)
@@ -576,9 +738,11 @@ class MainWindow(QtWidgets.QMainWindow):
         self.btn_copy_all.clicked.connect(self.copy_summary)
         self.btn_export_json.clicked.connect(self.export_json)
         self.btn_export_csv.clicked.connect(self.export_csv)
+        self.btn_export_map.clicked.connect(self.export_outcome_map)
 
         self.cb_task.currentTextChanged.connect(self._on_task_change)
         self.btn_show_strat.clicked.connect(self.on_show_strategy)
+        self.btn_tree_strat.clicked.connect(self.on_strategy_tree)
         self.btn_copy_strat.clicked.connect(self.copy_strategy)
 
     def _apply_styles(self):
@@ -739,13 +903,21 @@ class MainWindow(QtWidgets.QMainWindow):
             s_max = max(self.sp_smin.value(), self.sp_smax.value())
             start_template = self._collect_start_template()
 
+            self._live = {19: [], 20: [], 21: []}
+            self._render_results([], [], [])
             self._set_busy(True, "Подготовка...")
             self.worker_thread = QtCore.QThread(self)
-            self.worker = SolveWorker(rules, start_template, s_min, s_max)
+            if self.chk_profile.isChecked() != self._profile:
+                # Живые solver'ы созданы с другим режимом замеров
+                self._profile = self.chk_profile.isChecked()
+                self._session.clear()
+            self.worker = SolveWorker(self._session, rules, start_template, s_min, s_max,
+                                      workers=self.sp_workers.value())
             self.worker.moveToThread(self.worker_thread)
 
             self.worker.started.connect(lambda: self._set_busy(True, "Считаем..."))
             self.worker.progress.connect(self._on_progress)
+            self.worker.partial.connect(self._on_partial)
             self.worker.finished.connect(self._on_finished)
             self.worker.error.connect(self._on_error)
             self.worker_thread.started.connect(self.worker.run)
@@ -781,11 +953,31 @@ class MainWindow(QtWidgets.QMainWindow):
         self.progress.setValue(i)
         self.progress.setFormat(f"Идёт расчёт... {i}/{total} ({(i / total * 100):.0f}%)")
 
+    def _on_partial(self, s19: List[int], s20: List[int], s21: List[int]):
+        for task, new in zip((19, 20, 21), (s19, s20, s21)):
+            self._live[task].extend(new)
+        self._render_results(self._live[19], self._live[20], self._live[21])
+
     def _on_finished(self, s19: List[int], s20: List[int], s21: List[int], dt: float, meta: dict):
         self._set_busy(False)
         self._last_results = {19: s19, 20: s20, 21: s21}
         self._last_meta = meta
+        self._render_results(s19, s20, s21)
+        self._refresh_strategy_inputs()
+        if meta.get("cancelled"):
+            total = meta["s_max"] - meta["s_min"] + 1
+            self.statusBar().showMessage(
+                f"Расчёт отменён: проверено {meta['done']} из {total} S. "
+                f"Найдено: 19={len(s19)}, 20={len(s20)}, 21={len(s21)}",
+                8000,
+            )
+        else:
+            self.statusBar().showMessage(
+                f"Готово за {dt:.3f} сек. Найдено: 19={len(s19)}, 20={len(s20)}, 21={len(s21)}",
+                8000,
+            )
 
+    def _render_results(self, s19: List[int], s20: List[int], s21: List[int]):
         def mm(vals: List[int]) -> Tuple[Optional[int], Optional[int], int]:
             return (min(vals) if vals else None, max(vals) if vals else None, len(vals))
 
@@ -805,12 +997,6 @@ class MainWindow(QtWidgets.QMainWindow):
         self.txt20.setPlainText(format_list(s20))
         self.txt21.setPlainText(format_list(s21))
 
-        self._refresh_strategy_inputs()
-        self.statusBar().showMessage(
-            f"Готово за {dt:.3f} сек. Найдено: 19={len(s19)}, 20={len(s20)}, 21={len(s21)}",
-            8000,
-        )
-
     def _refresh_strategy_inputs(self):
         task = int(self.cb_task.currentText())
         vals = sorted(self._last_results.get(task, []))
@@ -819,9 +1005,11 @@ class MainWindow(QtWidgets.QMainWindow):
             for v in vals:
                 self.cb_S.addItem(str(v))
             self.btn_show_strat.setEnabled(True)
+            self.btn_tree_strat.setEnabled(True)
         else:
             self.cb_S.addItem("— нет подходящих S —")
             self.btn_show_strat.setEnabled(False)
+            self.btn_tree_strat.setEnabled(False)
 
     def _on_task_change(self, _txt: str):
         self._refresh_strategy_inputs()
@@ -908,6 +1096,43 @@ class MainWindow(QtWidgets.QMainWindow):
                 ])
         self.statusBar().showMessage(f"CSV сохранён: {fname}", 5000)
 
+    def export_outcome_map(self):
+        if not self._last_meta:
+            QtWidgets.QMessageBox.information(self, "Карта исходов", "Сначала выполните расчёт.")
+            return
+        if np is None:
+            QtWidgets.QMessageBox.warning(self, "Карта исходов", "Для карты исходов нужен numpy.")
+            return
+        fname, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Сохранить карту исходов", "outcomes.npy",
+                                                         "NumPy (*.npy)")
+        if not fname:
+            return
+        meta = self._last_meta
+        # Область — как у последнего расчёта (по правилам из meta, а не из уже изменённых полей)
+        solver = make_solver(GameRules(**meta["rules"]), tuple(meta["start_template"]), meta["s_min"], meta["s_max"])
+
+        dlg = QtWidgets.QProgressDialog("Запись карты исходов...", "Отмена", 0, 1000, self)
+        dlg.setWindowModality(QtCore.Qt.WindowModality.WindowModal)
+        dlg.setMinimumDuration(300)
+
+        def cb_progress(done: int, total: int):
+            dlg.setValue(int(1000 * done / max(total, 1)))
+            QtWidgets.QApplication.processEvents()
+
+        try:
+            write_outcome_npy(solver, fname, progress_cb=cb_progress, cancel_cb=dlg.wasCanceled)
+            png = os.path.splitext(fname)[0] + ".png"
+            if solver.rules.heaps <= 2:
+                write_heatmap_png(solver, png)
+        except RuntimeError as e:
+            if str(e) != "CANCELLED":
+                raise
+            self.statusBar().showMessage("Запись карты исходов отменена.", 5000)
+            return
+        finally:
+            dlg.close()
+        self.statusBar().showMessage(f"Карта исходов сохранена: {fname}", 5000)
+
     def on_show_strategy(self):
         if not any(self._last_results.values()):
             QtWidgets.QMessageBox.information(self, "Стратегия", "Сначала выполните расчёт.")
@@ -921,20 +1146,38 @@ class MainWindow(QtWidgets.QMainWindow):
 
         rules = self._collect_rules()
         start_template = self._collect_start_template()
-        solver = EGESolver(rules, start_template, S, S)
-
-        if task == 19:
-            text = solver.sample_strategy_19(S)
-        elif task == 20:
-            text = solver.sample_strategy_20(S, limit_examples=6)
-        else:
-            text = solver.sample_strategy_21(S, limit_examples=6)
+        # Тот же живой solver, что считал списки, — с его кэшами и таблицами
+        text = self._session.sample_strategy(rules, start_template, task, S,
+                                             limit_examples=None if task == 19 else 6)
 
         self.txt_strategy.setPlainText(
             text
             or "Для выбранного S и задания стратегию построить не удалось.\nУбедитесь, что S входит в соответствующий список."
         )
 
+    def on_strategy_tree(self):
+        if not any(self._last_results.values()):
+            QtWidgets.QMessageBox.information(self, "Стратегия", "Сначала выполните расчёт.")
+            return
+        task = int(self.cb_task.currentText())
+        try:
+            S = int(self.cb_S.currentText())
+        except ValueError:
+            QtWidgets.QMessageBox.warning(self, "Стратегия", "Выберите корректное S.")
+            return
+
+        rules = self._collect_rules()
+        start_template = self._collect_start_template()
+        dag = self._session.strategy_dag(rules, start_template, task, S)
+        if dag is None:
+            QtWidgets.QMessageBox.information(
+                self, "Стратегия", "Для выбранного S и задания стратегию построить не удалось."
+            )
+            return
+        # Подписи ходов в дереве; пока идёт расчёт, сессию не ждём — хватит временного solver'а
+        solver = self._session.solver(rules, start_template, wait=False) or EGESolver(rules, start_template, S, S)
+        StrategyTreeDialog(dag, solver, self).exec()
+
     def copy_strategy(self):
         QtWidgets.QApplication.clipboard().setText(self.txt_strategy.toPlainText())
         self.statusBar().showMessage("Стратегия скопирована.", 4000)
@@ -962,6 +1205,8 @@ class MainWindow(QtWidgets.QMainWindow):
         self.sp_fixed.setValue(int(s.value("fixed", 5)))
         self.sp_smin.setValue(int(s.value("smin", 1)))
         self.sp_smax.setValue(int(s.value("smax", 130)))
+        self.sp_workers.setValue(int(s.value("workers", 1)))
+        self.chk_profile.setChecked(str(s.value("profile", "false")).lower() == "true")
 
     def _safe_set_list(self, editor: IntListEditor, raw: object):
         try:
@@ -983,6 +1228,8 @@ class MainWindow(QtWidgets.QMainWindow):
         s.setValue("fixed", self.sp_fixed.value())
         s.setValue("smin", self.sp_smin.value())
         s.setValue("smax", self.sp_smax.value())
+        s.setValue("workers", self.sp_workers.value())
+        s.setValue("profile", "true" if self.chk_profile.isChecked() else "false")
 
 
 def main():
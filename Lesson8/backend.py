@@ -1,6 +1,19 @@
 import ast
+import copy
 from dataclasses import dataclass
-from typing import Callable, Dict, Optional, Tuple, List
+from functools import reduce
+from typing import Callable, Dict, Optional, Sequence, Tuple, List
+
+try:
+    import numpy as np
+except ImportError:  # без numpy формула перебирается по точкам
+    np = None
+
+# Точек сетки A × x × y, которые векторный перебор считает за раз (память — несколько массивов такой длины)
+GRID_CHUNK = 1 << 20
+# Векторный перебор считает в int64: формулы, промежуточные значения которых могут выйти
+# за этот предел (Python-целые не переполняются), считаются по точкам
+_INT_LIMIT = 2 ** 62
 
 
 _ALLOWED_FUNCS = {
@@ -69,23 +82,437 @@ def _validate_ast(tree: ast.AST, allowed_names: set):
                 raise UnsafeExpression(f"Функция запрещена: {node.func.id}")
 
 
-def compile_formula(expr: str, variables: Tuple[str, ...]) -> Callable[[Dict[str, int]], bool]:
+def compile_formula(expr: str, variables: Tuple[str, ...]) -> Callable[..., object]:
+    """
+    Формула -> обычная функция Python с позиционными параметрами в порядке variables,
+    например compile_formula("x % A == 0", ("A", "x")) -> lambda A, x: x % A == 0.
+    Функция собирается один раз; при вызове не создаётся ни одного словаря.
+    Результат — значение выражения (для проверки истинности bool() не нужен).
+    """
+    tree = _parse_formula(expr, variables)
+    return _make_function(tree.body, variables, _ALLOWED_FUNCS)
+
+
+def _parse_formula(expr: str, variables: Tuple[str, ...]) -> ast.Expression:
     expr = expr.strip()
     if not expr:
         raise ValueError("Пустое выражение")
+    if len(set(variables)) != len(variables):
+        raise ValueError(f"Повторяющиеся переменные: {variables}")
 
     tree = ast.parse(expr, mode="eval")
     allowed_names = set(variables) | set(_ALLOWED_FUNCS.keys())
     _validate_ast(tree, allowed_names)
+    return tree
+
+
+def _make_function(body: ast.expr, variables: Tuple[str, ...], funcs: Dict[str, Callable]) -> Callable[..., object]:
+    """lambda variables: body, где имена функций формулы берутся из funcs."""
+    args = ast.arguments(posonlyargs=[], args=[ast.arg(arg=v) for v in variables],
+                         kwonlyargs=[], kw_defaults=[], defaults=[])
+    lam = ast.Expression(body=ast.Lambda(args=args, body=body))
+    code = compile(ast.fix_missing_locations(lam), "<formula>", "eval")
+
+    glb = {"__builtins__": {}}
+    glb.update(funcs)
+    return eval(code, glb)
+
+
+# ---------- Вынос инвариантов из циклов по x, y ----------
+def compile_staged(expr: str, variables: Tuple[str, ...]) -> Callable[..., object]:
+    """
+    Формула по уровням перебора: для variables (A, x, y) f(A)(x)(y) — значение формулы,
+    для одной переменной — просто compile_formula.
+    Подвыражения, зависящие только от уже заданных переменных (div(x, A) — от A и x), считаются
+    один раз на уровне, а не в каждой точке внутреннего цикла. Если истинность всей формулы решают
+    они одни (ложное первое звено and и т.п., см. _Hoister.truth), уровень возвращает True/False
+    вместо функции следующей переменной — внутренний перебор не нужен. Ошибки — те же, что при счёте
+    формулы по точкам: вынесенное значение, которое падает, отменяет вынос на этом уровне.
+    """
+    tree = _parse_formula(expr, variables)
+    f = _make_function(tree.body, variables, _ALLOWED_FUNCS)
+    if len(variables) == 1:
+        return f
+
+    # Уровень k — вложенная функция от k-й переменной; вынесенные значения внешних уровней
+    # внутренние видят через замыкание:
+    #   def _level0(A):
+    #       _0_0 = ...                      # зависит только от A
+    #       if _0_0: return False           # формула решена для всех x, y
+    #       def _level1(x): ...
+    #       return _level1
+    lines, body, booleans = [], tree.body, set()
+    for k, v in enumerate(variables[:-1]):
+        pad = "    " * k
+        hoister = _Hoister(set(variables[k + 1:]), f"_{k}_", booleans)
+        is_true, is_false = hoister.truth(body)
+        body = hoister.replace(body)
+        booleans = hoister.booleans
+        lines.append(f"{pad}def _level{k}({v}):")
+        if hoister.hoisted:
+            lines.append(f"{pad}    try:")
+            lines += [f"{pad}        {name} = {ast.unparse(node)}" for name, node in zip(hoister.names, hoister.hoisted)]
+            # Вынесенное подвыражение могло быть в ветке, до которой формула не доходит (деление на 0 и т.п.)
+            lines.append(f"{pad}    except _errors:")
+            lines.append(f"{pad}        return _fallback({', '.join(variables[:k + 1])})")
+        for value, cond in ((True, is_true), (False, is_false)):
+            if cond is not None:
+                lines.append(f"{pad}    if {ast.unparse(cond)}:")
+                lines.append(f"{pad}        return {value}")
+    lines.append(f"{'    ' * (len(variables) - 2)}    return lambda {variables[-1]}: {ast.unparse(body)}")
+    for k in reversed(range(len(variables) - 2)):
+        lines.append(f"{'    ' * k}    return _level{k + 1}")
+
+    glb = {"__builtins__": {}}
+    glb.update(_ALLOWED_FUNCS)
+    glb["_errors"] = (ArithmeticError, TypeError, ValueError)
+    glb["_fallback"] = lambda *args: _curried(f, list(args), len(variables) - len(args))
+    exec(compile("\n".join(lines), "<formula>", "exec"), glb)
+    return glb["_level0"]
+
+
+def _curried(f: Callable[..., object], args: List[int], left: int) -> Callable[..., object]:
+    """Остальные уровни compile_staged без выноса: исходная формула по точкам."""
+    if left == 1:
+        return lambda v: f(*args, v)
+    return lambda v: _curried(f, args + [v], left - 1)
+
+
+def _any(conds: List[Optional[ast.expr]]) -> Optional[ast.expr]:
+    conds = [c for c in conds if c is not None]
+    if not conds:
+        return None
+    return conds[0] if len(conds) == 1 else ast.BoolOp(op=ast.Or(), values=conds)
+
+
+def _all(conds: List[Optional[ast.expr]]) -> Optional[ast.expr]:
+    if any(c is None for c in conds):
+        return None
+    return conds[0] if len(conds) == 1 else ast.BoolOp(op=ast.And(), values=conds)
+
+
+def _cannot_raise(node: ast.expr) -> bool:
+    """
+    Выражение считается без ошибок при любых целых значениях переменных. Проверка по записи, с запасом:
+    делители и показатели — только положительные константы, функции — с правильным числом аргументов.
+    """
+    arity = {"div": (2, 2), "between": (3, 3), "in_seg": (3, 3), "in_int": (3, 3), "abs": (1, 1),
+             "max": (2, None), "min": (2, None)}
+    calls = {id(n.func) for n in ast.walk(node) if isinstance(n, ast.Call)}
+    for n in ast.walk(node):
+        if isinstance(n, ast.Constant) and not isinstance(n.value, int):
+            return False
+        if isinstance(n, ast.Name) and n.id in _ALLOWED_FUNCS and id(n) not in calls:
+            return False
+        if isinstance(n, ast.BinOp) and isinstance(n.op, ast.Div):
+            return False  # дальше вещественное значение: & и т.п. над ним падают
+        if isinstance(n, ast.BinOp) and isinstance(n.op, (ast.FloorDiv, ast.Mod, ast.Pow, ast.LShift, ast.RShift)):
+            divisor = n.right
+        elif isinstance(n, ast.Call):
+            lo, hi = arity[n.func.id]
+            if n.keywords or len(n.args) < lo or (hi is not None and len(n.args) > hi):
+                return False
+            if n.func.id != "div":
+                continue
+            divisor = n.args[1]
+        else:
+            continue
+        if not (isinstance(divisor, ast.Constant) and isinstance(divisor.value, int) and divisor.value > 0):
+            return False
+    return True
 
-    code = compile(tree, "<formula>", "eval")
 
-    def _f(env: Dict[str, int]) -> bool:
-        glb = {"__builtins__": {}}
-        glb.update(_ALLOWED_FUNCS)
-        return bool(eval(code, glb, env))
+class _Hoister:
+    """
+    Вынос подвыражений, не зависящих от переменных внутренних циклов (later), в имена prefix0, prefix1, ...
+    booleans — уже вынесенные имена со значением bool (для распознавания импликаций).
+    """
 
-    return _f
+    def __init__(self, later: set, prefix: str, booleans: set):
+        self.later = later
+        self.prefix = prefix
+        self.booleans = set(booleans)
+        self.hoisted: List[ast.expr] = []
+        self.names: List[str] = []
+        self._ids: Dict[int, str] = {}
+
+    def _invariant(self, node: ast.AST) -> bool:
+        return not any(isinstance(n, ast.Name) and n.id in self.later for n in ast.walk(node))
+
+    def _boolean(self, node: ast.AST) -> bool:
+        if isinstance(node, ast.Name):
+            return node.id in self.booleans
+        if isinstance(node, ast.BoolOp):
+            return all(self._boolean(v) for v in node.values)
+        return _is_boolean(node)
+
+    def _name(self, node: ast.expr) -> Optional[str]:
+        """Имя для инвариантного подвыражения (выносится один раз), None — выносить нечего."""
+        if isinstance(node, (ast.Name, ast.Constant)) or not self._invariant(node):
+            return None
+        if id(node) not in self._ids:
+            name = f"{self.prefix}{len(self.names)}"
+            self._ids[id(node)] = name
+            self.names.append(name)
+            self.hoisted.append(node)
+            if self._boolean(node):
+                self.booleans.add(name)
+        return self._ids[id(node)]
+
+    def replace(self, node: ast.expr) -> ast.expr:
+        """Копия node, в которой максимальные инвариантные подвыражения заменены именами."""
+        name = self._name(node)
+        if name is not None:
+            return ast.Name(id=name, ctx=ast.Load())
+        new = copy.copy(node)
+        for field, value in ast.iter_fields(node):
+            if isinstance(value, list):
+                setattr(new, field, [self.replace(v) if isinstance(v, ast.expr) else v for v in value])
+            elif isinstance(value, ast.expr):
+                setattr(new, field, self.replace(value))
+        return new
+
+    def truth(self, node: ast.expr) -> Tuple[Optional[ast.expr], Optional[ast.expr]]:
+        """
+        (условие «node истинно», условие «node ложно») на вынесенных именах; None — по ним не узнать.
+        Разбираются and/or/not и импликации a <= b, a >= b между bool. Условие выполняется, только если
+        Python, считая node по порядку, не дойдёт до невынесенных частей, которые могут упасть (_cannot_raise):
+        иначе ответ уровня разошёлся бы с ошибкой перебора по точкам.
+        """
+        name = node.id if isinstance(node, ast.Name) and node.id not in self.later else self._name(node)
+        if name is not None:
+            value = ast.Name(id=name, ctx=ast.Load())
+            return value, ast.UnaryOp(op=ast.Not(), operand=value)
+        if isinstance(node, ast.Constant):
+            return (ast.Constant(value=True), None) if node.value else (None, ast.Constant(value=True))
+        if isinstance(node, ast.BoolOp):
+            # and решается ложным звеном, перед которым все истинны; or — истинным, перед которым все ложны
+            parts = [self.truth(v) for v in node.values]
+            if isinstance(node.op, ast.Or):
+                parts = [(f, t) for t, f in parts]
+            decided, prefix = [], []
+            for value, (go_on, stop) in zip(node.values, parts):
+                if stop is not None:
+                    decided.append(_all(prefix + [stop]))
+                if go_on is None:
+                    if not _cannot_raise(value):
+                        break
+                    continue  # звено не решено, но и не упадёт: как бы оно ни вышло, решает следующее
+                prefix.append(go_on)
+            if isinstance(node.op, ast.And):
+                return _all([t for t, _ in parts]), _any(decided)
+            return _any(decided), _all([t for t, _ in parts])
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            is_true, is_false = self.truth(node.operand)
+            return is_false, is_true
+        if isinstance(node, ast.Compare) and len(node.ops) == 1 and isinstance(node.ops[0], (ast.LtE, ast.GtE)) \
+                and self._boolean(node.left) and self._boolean(node.comparators[0]):
+            a, b = node.left, node.comparators[0]
+            if isinstance(node.ops[0], ast.GtE):
+                a, b = b, a
+            (a_true, a_false), (b_true, b_false) = self.truth(a), self.truth(b)
+            # Сравнение считает обе стороны: решающая сторона годится, если другая посчитается без ошибки
+            # (если обе её истинности известны, она решена при любых вынесенных значениях)
+            a_ok = [] if None not in (a_true, a_false) or _cannot_raise(a) else [None]
+            b_ok = [] if None not in (b_true, b_false) or _cannot_raise(b) else [None]
+            return _any([_all([a_false] + b_ok), _all([b_true] + a_ok)]), _all([a_true, b_false])
+        return None, None
+
+
+# ---------- Векторный перебор (numpy) ----------
+def _np_num(v):
+    """bool -> int перед арифметикой: в Python True + True == 2, а у массивов bool — True."""
+    if isinstance(v, np.ndarray):
+        return v.astype(np.int64) if v.dtype == bool else v
+    return int(v) if isinstance(v, (bool, np.bool_)) else v
+
+
+def _np_and(*values):
+    # a and b: b, если a истинно, иначе a — как в Python, но без короткого замыкания
+    return reduce(lambda res, v: np.where(res, v, res), values)
+
+
+def _np_or(*values):
+    return reduce(lambda res, v: np.where(res, res, v), values)
+
+
+_NP_FUNCS = {
+    "div": lambda a, b: np.remainder(a, b) == 0,
+    "between": lambda x, l, r: (l <= x) & (x <= r),
+    "in_seg": lambda x, l, r: (l <= x) & (x <= r),
+    "in_int": lambda x, l, r: (l < x) & (x < r),
+    "abs": lambda v: np.abs(v),
+    "max": lambda *args: reduce(np.maximum, args),
+    "min": lambda *args: reduce(np.minimum, args),
+    "_num": _np_num,
+    "_and": _np_and,
+    "_or": _np_or,
+    "_not": lambda v: np.logical_not(v),
+}
+
+_BIT_OPS = (ast.BitAnd, ast.BitOr, ast.BitXor)
+
+
+class _ToNumpy(ast.NodeTransformer):
+    """
+    Формула над числами -> та же формула над массивами numpy:
+    and/or/not и цепочки сравнений — через _and/_or/_not, операнды арифметики — через _num.
+    """
+
+    @staticmethod
+    def _call(name: str, args: List[ast.expr]) -> ast.Call:
+        return ast.Call(func=ast.Name(id=name, ctx=ast.Load()), args=args, keywords=[])
+
+    def visit_BoolOp(self, node: ast.BoolOp) -> ast.AST:
+        self.generic_visit(node)
+        return self._call("_and" if isinstance(node.op, ast.And) else "_or", node.values)
+
+    def visit_UnaryOp(self, node: ast.UnaryOp) -> ast.AST:
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return self._call("_not", [node.operand])
+        node.operand = self._call("_num", [node.operand])
+        return node
+
+    def visit_BinOp(self, node: ast.BinOp) -> ast.AST:
+        self.generic_visit(node)
+        if not isinstance(node.op, _BIT_OPS):
+            node.left = self._call("_num", [node.left])
+            node.right = self._call("_num", [node.right])
+        return node
+
+    def visit_Compare(self, node: ast.Compare) -> ast.AST:
+        self.generic_visit(node)
+        if len(node.ops) == 1:
+            return node
+        items = [node.left] + node.comparators  # a < b < c -> (a < b) and (b < c); формулы без побочных эффектов
+        return self._call("_and", [ast.Compare(left=items[i], ops=[op], comparators=[items[i + 1]])
+                                   for i, op in enumerate(node.ops)])
+
+
+def _bits_hull(a: Tuple[int, int], b: Tuple[int, int]) -> Tuple[int, int]:
+    m = 1 << max(abs(a[0]), abs(a[1]), abs(b[0]), abs(b[1])).bit_length()
+    return -m, m
+
+
+def _interval(node: ast.AST, bounds: Dict[str, Tuple[int, int]]) -> Optional[Tuple[int, int]]:
+    """
+    Границы значений выражения при переменных из bounds (None — оценить нельзя: вещественные
+    константы, отрицательные степени и сдвиги и т.п.). Деление на 0 здесь не ловится — его ловит errstate.
+    """
+    def sub(n):
+        return _interval(n, bounds)
+
+    if isinstance(node, ast.Name):
+        return bounds.get(node.id)
+    if isinstance(node, ast.Constant):
+        v = node.value
+        return (int(v), int(v)) if isinstance(v, int) else None
+    if isinstance(node, ast.Compare):
+        parts = [sub(n) for n in [node.left] + node.comparators]
+        return None if None in parts else (0, 1)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        return None if sub(node.operand) is None else (0, 1)
+    if isinstance(node, ast.BoolOp):
+        parts = [sub(n) for n in node.values]
+        if None in parts:
+            return None
+        return min(p[0] for p in parts), max(p[1] for p in parts)
+    if isinstance(node, ast.UnaryOp):
+        a = sub(node.operand)
+        if a is None:
+            return None
+        if isinstance(node.op, ast.USub):
+            return -a[1], -a[0]
+        if isinstance(node.op, ast.Invert):
+            return -a[1] - 1, -a[0] - 1
+        return a
+    if isinstance(node, ast.Call):
+        parts = [sub(n) for n in node.args]
+        name = node.func.id
+        if None in parts or node.keywords:
+            return None
+        if name in ("div", "between", "in_seg", "in_int"):
+            return (0, 1) if len(parts) == (2 if name == "div" else 3) else None
+        if name == "abs" and len(parts) == 1:
+            return 0, max(abs(parts[0][0]), abs(parts[0][1]))
+        if name in ("max", "min") and len(parts) >= 2:
+            pick = max if name == "max" else min
+            return pick(p[0] for p in parts), pick(p[1] for p in parts)
+        return None
+    if isinstance(node, ast.BinOp):
+        a, b = sub(node.left), sub(node.right)
+        if a is None or b is None:
+            return None
+        op = node.op
+        ma = max(abs(a[0]), abs(a[1]))
+        if isinstance(op, ast.Add):
+            return a[0] + b[0], a[1] + b[1]
+        if isinstance(op, ast.Sub):
+            return a[0] - b[1], a[1] - b[0]
+        if isinstance(op, ast.Mult):
+            prods = [u * v for u in a for v in b]
+            return min(prods), max(prods)
+        if isinstance(op, (ast.FloorDiv, ast.Div)):
+            return -ma, ma
+        if isinstance(op, ast.Mod):
+            mb = max(abs(b[0]), abs(b[1]))
+            return -mb, mb
+        if isinstance(op, ast.Pow):
+            if b[0] < 0 or (b[1] > 64 and ma > 1):
+                return None
+            m = ma ** b[1] if ma > 1 else 1
+            return -m, m
+        if isinstance(op, (ast.LShift, ast.RShift)):
+            if b[0] < 0 or b[1] > 63:
+                return None
+            m = ma << b[1] if isinstance(op, ast.LShift) else ma
+            return -m, m
+        if isinstance(op, _BIT_OPS):
+            return _bits_hull(a, b)
+    return None
+
+
+def _fits_int64(tree: ast.AST, bounds: Dict[str, Tuple[int, int]]) -> bool:
+    """Все подвыражения формулы гарантированно помещаются в int64 (с запасом)."""
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.expr_context, ast.operator, ast.unaryop, ast.boolop, ast.cmpop, ast.Expression)):
+            continue
+        if isinstance(node, ast.Name) and node.id not in bounds:
+            continue  # имя функции в вызове
+        iv = _interval(node, bounds)
+        if iv is None or iv[0] < -_INT_LIMIT or iv[1] > _INT_LIMIT:
+            return False
+    return True
+
+
+def _may_raise(tree: ast.AST, bounds: Dict[str, Tuple[int, int]]) -> bool:
+    """
+    Формула может упасть хоть в одной точке из bounds: делитель может быть 0, или значение
+    не оценить (вещественные, отрицательные степени и сдвиги, вызов с лишними аргументами). Оценка с запасом.
+    """
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.BinOp, ast.UnaryOp, ast.Call)) and _interval(node, bounds) is None:
+            return True
+        if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.FloorDiv, ast.Div, ast.Mod)):
+            divisor = node.right
+        elif isinstance(node, ast.Call) and node.func.id == "div":
+            divisor = node.args[1]
+        else:
+            continue
+        lo, hi = _interval(divisor, bounds)
+        if lo <= 0 <= hi:
+            return True
+    return False
+
+
+def _as_array(values: Sequence[int]) -> Optional["np.ndarray"]:
+    """Последовательность A/x/y массивом int64 (None — значения за пределами векторного перебора)."""
+    if len(values) and max(abs(values[0]), abs(values[-1])) > _INT_LIMIT:
+        return None
+    if isinstance(values, range):
+        return np.arange(values.start, values.stop, values.step, dtype=np.int64)
+    return np.array(values, dtype=np.int64)
 
 
 @dataclass
@@ -95,18 +522,15 @@ class Domain:
     step: int = 1
 
     def values(self):
+        yield from self.points()
+
+    def points(self) -> range:
+        """Значения диапазона от lo к hi как range: длина и i-е значение — без перебора."""
         if self.step == 0:
             raise ValueError("step не может быть 0")
         if self.lo <= self.hi:
-            x = self.lo
-            while x <= self.hi:
-                yield x
-                x += self.step
-        else:
-            x = self.lo
-            while x >= self.hi:
-                yield x
-                x -= abs(self.step)
+            return range(self.lo, self.hi + 1, abs(self.step))
+        return range(self.lo, self.hi - 1, -abs(self.step))
 
 
 @dataclass
@@ -123,116 +547,449 @@ class SolveConfig:
     a_domain: Domain
     objective: str  # "min" | "max" | "all"
     a_name: str = "A"
+    # Монотонность условия по A: "up" — если A подходит, подходят и все большие A; "down" — все меньшие;
+    # "auto" — определить по формуле (если не удалось — как "no"); "no" — не использовать
+    monotone: str = "auto"
+
+
+# Сколько последних решающих точек пробовать первыми для следующего A (для внутреннего квантора — меньше:
+# они пробуются при каждом x)
+HINTS = 8
+INNER_HINTS = 2
+
+
+class _Hints:
+    """
+    Точки, решившие проверку предыдущих A: контрпримеры для forall и свидетели для exists.
+    Для соседнего A условие обычно решается на них же, поэтому они проверяются до перебора диапазона.
+    - outer: x, решившие весь квантор;
+    - inner: y, решившие внутренний квантор при фиксированном x.
+    """
+
+    def __init__(self):
+        self.outer: List = []
+        self.inner: List = []
+
+    @staticmethod
+    def remember(points: List, p, size: int = HINTS) -> None:
+        if points and points[0] == p:
+            return
+        if p in points:
+            points.remove(p)
+        points.insert(0, p)
+        del points[size:]
+
+
+def _decisive(g: Callable[..., object], hints: List, forall: bool) -> Optional[int]:
+    """Первая из подсказок, на которой квантор решается (контрпример для forall, свидетель для exists), или None."""
+    for v in hints:
+        if bool(g(v)) != forall:
+            return v
+    return None
 
 
 def _check_one_A(
-    f: Callable[[Dict[str, int]], bool],
+    f: Callable[..., object],
     A: int,
     cfg: SolveConfig,
+    hints: Optional[_Hints] = None,
 ) -> bool:
-    env_base = {cfg.a_name: A}
-
-    def eval_with(env_add: Dict[str, int]) -> bool:
-        env = dict(env_base)
-        env.update(env_add)
-        return f(env)
-
+    """
+    Выполняется ли формула для данного A. f — compile_staged с параметрами
+    (A, x, y), из которых оставлены только заданные кванторами x и y.
+    hints — решающие точки прошлых A (см. _Hints); сюда же записываются новые. Подсказки проверяются
+    раньше точек, идущих в диапазоне перед ними, поэтому годятся, только если формула нигде не падает
+    (_may_raise): иначе ошибка, до которой дошёл бы обычный перебор, терялась бы. None — без подсказок.
+    """
     qx, qy = cfg.ax, cfg.ay
 
     if qx.mode == "none" and qy.mode == "none":
-        return eval_with({})
+        return bool(f(A))
 
     if qx.mode != "none" and qx.domain is None:
         raise ValueError("Задан квантор x, но нет диапазона")
     if qy.mode != "none" and qy.domain is None:
         raise ValueError("Задан квантор y, но нет диапазона")
+    quants = [q for q in (qx, qy) if q.mode != "none"]
+    if len(quants) == 2 and any(q.mode not in ("forall", "exists") for q in quants):
+        raise ValueError("Неизвестные кванторы")
 
-    if qx.mode == "none":
-        def check_y() -> bool:
-            if qy.mode == "forall":
-                for y in qy.domain.values():
-                    if not eval_with({"y": y}):
-                        return False
-                return True
-            else:
-                for y in qy.domain.values():
-                    if eval_with({"y": y}):
-                        return True
-                return False
-        return check_y()
-
-    if qy.mode == "none":
-        def check_x() -> bool:
-            if qx.mode == "forall":
-                for x in qx.domain.values():
-                    if not eval_with({"x": x}):
-                        return False
-                return True
-            else:
-                for x in qx.domain.values():
-                    if eval_with({"x": x}):
-                        return True
-                return False
-        return check_x()
-
-    def check_for_xy() -> bool:
-        if qx.mode == "forall" and qy.mode == "forall":
-            for x in qx.domain.values():
-                for y in qy.domain.values():
-                    if not eval_with({"x": x, "y": y}):
-                        return False
+    if hints is None:
+        hints = _Hints()
+    outer, inner, remember = hints.outer, hints.inner, hints.remember
+
+    at = f(A)
+    if at is True or at is False:  # формула решена при этом A для всех x, y; кванторы по пустым диапазонам — нет
+        for q in reversed(quants):
+            if not q.domain.points():
+                at = q.mode == "forall"
+        return at
+
+    if len(quants) == 1:
+        forall = quants[0].mode == "forall"
+        v = _decisive(at, outer, forall)
+        if v is not None:
+            remember(outer, v)
+            return not forall
+        if forall:
+            for v in quants[0].domain.values():
+                if not at(v):
+                    remember(outer, v)
+                    return False
             return True
-
-        if qx.mode == "forall" and qy.mode == "exists":
-            for x in qx.domain.values():
-                ok = False
-                for y in qy.domain.values():
-                    if eval_with({"x": x, "y": y}):
-                        ok = True
-                        break
-                if not ok:
+        for v in quants[0].domain.values():
+            if at(v):
+                remember(outer, v)
+                return True
+        return False
+
+    ys = list(qy.domain.values())
+    forall_x, forall_y = qx.mode == "forall", qy.mode == "forall"
+    if not ys:  # квантор по пустому y даёт одно и то же при любом x
+        return forall_y if qx.domain.points() else forall_x
+
+    def holds(x) -> bool:
+        at_x = at(x)
+        if at_x is True or at_x is False:
+            return at_x
+        for y in inner:  # как _decisive, но без лишнего вызова: это самый частый путь
+            if bool(at_x(y)) != forall_y:
+                if y is not inner[0]:
+                    remember(inner, y, INNER_HINTS)
+                return not forall_y
+        if forall_y:
+            for y in ys:
+                if not at_x(y):
+                    remember(inner, y, INNER_HINTS)
                     return False
             return True
+        for y in ys:
+            if at_x(y):
+                remember(inner, y, INNER_HINTS)
+                return True
+        return False
+
+    x = _decisive(holds, outer, forall_x)
+    if x is not None:
+        remember(outer, x)
+        return not forall_x
+    for x in qx.domain.values():
+        if holds(x) != forall_x:
+            remember(outer, x)
+            return not forall_x
+    return forall_x
+
+
+def _formula_variables(cfg: SolveConfig) -> Tuple[str, ...]:
+    """Параметры скомпилированной формулы: A, затем x и y, если по ним есть квантор."""
+    names = [cfg.a_name]
+    if cfg.ax.mode != "none":
+        names.append("x")
+    if cfg.ay.mode != "none":
+        names.append("y")
+    return tuple(names)
+
+
+def _grid_truth(g: Callable[..., object], args: List["np.ndarray"], inner: List["np.ndarray"],
+                tiles: List[int], modes: List[str]) -> "np.ndarray":
+    """
+    Значение кванторной формулы на сетке: args — A и уже зафиксированные внешние переменные
+    (оси под broadcasting), inner — диапазоны оставшихся кванторов, tiles — размер куска по каждой оси.
+    forall/exists — all/any по оси; куски одной оси объединяются через & / |.
+    """
+    level = len(args) - 1
+    shape = np.broadcast_shapes(*(a.shape for a in args))
+    if level == len(inner):
+        return np.broadcast_to(np.asarray(g(*args)).astype(bool), shape)
+    forall = modes[level] == "forall"
+    acc = np.full(shape, forall)
+    expanded = [a[..., None] for a in args]
+    dom, tile = inner[level], tiles[level]
+    for start in range(0, len(dom), tile):
+        col = dom[start:start + tile].reshape((1,) * len(args) + (-1,))
+        part = _grid_truth(g, expanded + [col], inner, tiles, modes)
+        if forall:
+            acc &= part.all(axis=-1)
+            if not acc.any():
+                break
+        else:
+            acc |= part.any(axis=-1)
+            if acc.all():
+                break
+    return acc
 
-        if qx.mode == "exists" and qy.mode == "forall":
-            for x in qx.domain.values():
-                ok = True
-                for y in qy.domain.values():
-                    if not eval_with({"x": x, "y": y}):
-                        ok = False
-                        break
-                if ok:
-                    return True
-            return False
 
-        if qx.mode == "exists" and qy.mode == "exists":
-            for x in qx.domain.values():
-                for y in qy.domain.values():
-                    if eval_with({"x": x, "y": y}):
-                        return True
-            return False
+def _variable_bounds(cfg: SolveConfig) -> Dict[str, Tuple[int, int]]:
+    """Границы A и заданных кванторами x, y (пустой диапазон — (0, 0))."""
+    res = {}
+    for name, dom in zip(_formula_variables(cfg), [cfg.a_domain] + [q.domain for q in (cfg.ax, cfg.ay)
+                                                                     if q.mode != "none"]):
+        points = dom.points() if dom is not None else range(0)
+        res[name] = (min(points[0], points[-1]), max(points[0], points[-1])) if points else (0, 0)
+    return res
 
-        raise ValueError("Неизвестные кванторы")
 
-    return check_for_xy()
+# ---------- Монотонность по A ----------
+# Направление зависимости от A: +1 — не убывает, -1 — не возрастает, 0 — не зависит, None — неизвестно
+def _same(*dirs: Optional[int]) -> Optional[int]:
+    res = 0
+    for d in dirs:
+        if d is None or (d and res and d != res):
+            return None
+        res = res or d
+    return res
 
 
-def solve(cfg: SolveConfig) -> List[int]:
-    vars_needed = {cfg.a_name}
-    if cfg.ax.mode != "none":
-        vars_needed.add("x")
-    if cfg.ay.mode != "none":
-        vars_needed.add("y")
+def _flip(d: Optional[int]) -> Optional[int]:
+    return None if d is None else -d
 
-    f = compile_formula(cfg.expr, tuple(sorted(vars_needed)))
 
-    good: List[int] = []
-    for A in cfg.a_domain.values():
-        if _check_one_A(f, A, cfg):
-            good.append(A)
+_BOOL_CALLS = ("div", "between", "in_seg", "in_int")
 
-    if cfg.objective == "all":
+
+def _is_boolean(node: ast.AST) -> bool:
+    """Значение узла — всегда bool (истинность совпадает со значением 0/1)."""
+    if isinstance(node, ast.Compare) or (isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not)):
+        return True
+    if isinstance(node, ast.Call):
+        return node.func.id in _BOOL_CALLS
+    if isinstance(node, ast.BoolOp):
+        return all(_is_boolean(v) for v in node.values)
+    return isinstance(node, ast.Constant) and isinstance(node.value, bool)
+
+
+class _Monotony:
+    """Направление зависимости значений и истинности подвыражений формулы от переменной a_name."""
+
+    def __init__(self, a_name: str, bounds: Dict[str, Tuple[int, int]]):
+        self.a_name = a_name
+        self.bounds = bounds
+
+    def _sign(self, node: ast.AST) -> Optional[int]:
+        """Знак значения, не зависящего от A: +1 (>= 0), -1 (<= 0), None — любой."""
+        iv = _interval(node, self.bounds)
+        if iv is None:
+            return None
+        return 1 if iv[0] >= 0 else (-1 if iv[1] <= 0 else None)
+
+    def truth(self, node: ast.AST) -> Optional[int]:
+        d = self.value(node)
+        if d is None or d == 0 or _is_boolean(node):
+            return d
+        sign = self._sign(node)  # истинность v != 0 монотонна по v, только пока знак v постоянен
+        return None if sign is None else d * sign
+
+    def value(self, node: ast.AST) -> Optional[int]:
+        if isinstance(node, ast.Name):
+            return 1 if node.id == self.a_name else 0
+        if isinstance(node, ast.Constant):
+            return 0
+        if isinstance(node, ast.BoolOp):
+            if all(_is_boolean(v) for v in node.values):
+                return _same(*(self.value(v) for v in node.values))
+            return 0 if _same(*(self.value(v) for v in node.values)) == 0 else None
+        if isinstance(node, ast.UnaryOp):
+            if isinstance(node.op, ast.Not):
+                return _flip(self.truth(node.operand))
+            d = self.value(node.operand)
+            return d if isinstance(node.op, ast.UAdd) else _flip(d)
+        if isinstance(node, ast.Compare):
+            items = [node.left] + node.comparators
+            dirs = []
+            for (a, b), op in zip(zip(items, items[1:]), node.ops):
+                da, db = self.value(a), self.value(b)
+                if isinstance(op, (ast.Lt, ast.LtE)):
+                    dirs.append(_same(_flip(da), db))
+                elif isinstance(op, (ast.Gt, ast.GtE)):
+                    dirs.append(_same(da, _flip(db)))
+                else:
+                    dirs.append(0 if da == db == 0 else None)
+            return _same(*dirs)
+        if isinstance(node, ast.Call):
+            args = [self.value(a) for a in node.args]
+            name = node.func.id
+            if name in ("between", "in_seg", "in_int") and len(args) == 3:
+                x, l, r = args  # l <= x <= r: монотонно, только если x от A не зависит
+                return _same(_flip(l), r) if x == 0 else None
+            if name in ("max", "min"):
+                return _same(*args)
+            if name == "abs" and len(args) == 1:
+                if args[0] == 0:
+                    return 0
+                sign = self._sign(node.args[0])
+                return None if sign is None or args[0] is None else args[0] * sign
+            return 0 if all(a == 0 for a in args) else None
+        if isinstance(node, ast.BinOp):
+            dl, dr = self.value(node.left), self.value(node.right)
+            if dl == 0 and dr == 0:
+                return 0
+            op = node.op
+            if isinstance(op, ast.Add):
+                return _same(dl, dr)
+            if isinstance(op, ast.Sub):
+                return _same(dl, _flip(dr))
+            if isinstance(op, ast.Mult):
+                if dl == 0 or dr == 0:  # умножение на не зависящий от A множитель постоянного знака
+                    factor, d = (node.left, dr) if dl == 0 else (node.right, dl)
+                    sign = self._sign(factor)
+                    return None if sign is None or d is None else d * sign
+                return None
+            if isinstance(op, (ast.FloorDiv, ast.Div, ast.RShift, ast.LShift)) and dr == 0:
+                sign = self._sign(node.right)
+                if isinstance(op, (ast.RShift, ast.LShift)):
+                    return dl if sign == 1 else None
+                iv = _interval(node.right, self.bounds)
+                if iv is None or iv[0] <= 0 <= iv[1] or dl is None:  # делитель может быть 0 или разного знака
+                    return None
+                return dl * sign
+            return None
+        return None
+
+
+def _detect_monotone(cfg: SolveConfig) -> str:
+    """
+    "up"/"down", если условие по построению монотонно по A, иначе "no". Кванторы по x и y
+    монотонность сохраняют: при каждом x, y условие монотонно — значит, и «для всех»/«существует».
+    Пример: ((x & 29 != 0) <= ((x & 12 == 0) <= (x & A != 0))) — не монотонно (& по A);
+    (div(x, 7) <= (x < A)) — "up".
+    """
+    names = _formula_variables(cfg)
+    tree = _parse_formula(cfg.expr, names)
+    d = _Monotony(cfg.a_name, _variable_bounds(cfg)).truth(tree.body)
+    return {0: "up", 1: "up", -1: "down"}.get(d, "no")  # не зависит от A — годится любой поиск
+
+
+def _grid_checker(cfg: SolveConfig) -> Optional[Tuple[Callable[["np.ndarray"], Optional["np.ndarray"]], int]]:
+    """
+    Векторная проверка пачки A: (массив A -> маска подходящих, сколько A считается за один кусок сетки).
+    None — формулу так не посчитать точно
+    (нет numpy, возможное переполнение int64, неподдерживаемые кванторы или диапазоны). Функция возвращает
+    None, если при счёте случилось деление на 0 или ошибка типов — тогда нужен перебор по точкам.
+    """
+    if np is None:
+        return None
+    quants = [q for q in (cfg.ax, cfg.ay) if q.mode != "none"]
+    if any(q.mode not in ("forall", "exists") or q.domain is None for q in quants):
+        return None
+    inner = [_as_array(q.domain.points()) for q in quants]
+    if any(d is None for d in inner):
+        return None
+    names = _formula_variables(cfg)
+    bounds = _variable_bounds(cfg)
+    if any(max(abs(lo), abs(hi)) > _INT_LIMIT for lo, hi in bounds.values()):
+        return None
+    tree = _parse_formula(cfg.expr, names)
+    if not _fits_int64(tree, bounds):
+        return None
+    g = _make_function(_ToNumpy().visit(tree).body, names, _NP_FUNCS)
+
+    tiles = []
+    room = GRID_CHUNK
+    for d in reversed(inner):  # внутренние оси — целиком, пока помещаются
+        tiles.insert(0, max(1, min(len(d), room)))
+        room = max(1, room // tiles[0])
+    modes = [q.mode for q in quants]
+
+    def check(A: "np.ndarray") -> Optional["np.ndarray"]:
+        good = np.empty(len(A), dtype=bool)
+        try:
+            with np.errstate(all="raise"):
+                for start in range(0, len(A), room):
+                    good[start:start + room] = _grid_truth(g, [A[start:start + room]], inner, tiles, modes)
+        except (ArithmeticError, TypeError, ValueError):
+            return None
         return good
+
+    return check, room
+
+
+class _Checker:
+    """
+    «Подходит ли A» для пачки значений A: векторно, пока это возможно, иначе — _check_one_A по точкам.
+    """
+
+    def __init__(self, cfg: SolveConfig):
+        self.cfg = cfg
+        self.f = compile_staged(cfg.expr, _formula_variables(cfg))
+        self.grid, self.rows = _grid_checker(cfg) or (None, 1)
+        tree = _parse_formula(cfg.expr, _formula_variables(cfg))
+        self.hints = None if _may_raise(tree, _variable_bounds(cfg)) else _Hints()
+
+    @property
+    def vectorized(self) -> bool:
+        return self.grid is not None
+
+    def __call__(self, values: Sequence[int]) -> List[bool]:
+        if self.grid is not None:
+            good = self.grid(_as_array(values))
+            if good is not None:
+                return good.tolist()
+            self.grid = None  # деление на 0 и т.п.: дальше — по точкам, с ошибками как у Python
+        return [_check_one_A(self.f, A, self.cfg, self.hints) for A in values]
+
+
+def _first_good(check: _Checker, values: Sequence[int]) -> Optional[int]:
+    """Первое подходящее значение в values. Векторно — пачками 1, 2, 4, ... (лишней работы не больше сделанной)."""
+    if not check.vectorized:
+        for A in values:
+            if check([A])[0]:
+                return A
+        return None
+    start, size = 0, 1
+    while start < len(values):
+        part = values[start:start + size]
+        good = check(part)
+        if True in good:
+            return part[good.index(True)]
+        start += size
+        size = min(2 * size, check.rows) if check.vectorized else 1
+    return None
+
+
+def _boundary(check: _Checker, values: Sequence[int]) -> int:
+    """
+    Для условия, которое вдоль values сначала ложно, потом истинно, — индекс первого
+    истинного (len(values), если истинных нет). Бинарный поиск: log2(len) проверок.
+    """
+    lo, hi = 0, len(values)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if check([values[mid]])[0]:
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
+def solve(cfg: SolveConfig) -> List[int]:
+    """
+    Подходящие A: все (objective="all", в порядке a_domain) или одно наименьшее/наибольшее.
+    min/max ищутся с нужного конца до первого подходящего A, а при монотонном по A условии
+    (cfg.monotone) — бинарным поиском границы, как и «all».
+    """
+    check = _Checker(cfg)
+    points = cfg.a_domain.points()
+    ascending = points if points.step > 0 else points[::-1]
+    monotone = cfg.monotone
+    if monotone == "auto":
+        monotone = _detect_monotone(cfg)
+    if monotone not in ("up", "down", "no"):
+        raise ValueError(f"Неизвестная монотонность: {cfg.monotone}")
+
+    if monotone == "up":  # подходящие A — хвост ascending
+        i = _boundary(check, ascending)
+        good = ascending[i:]
+    elif monotone == "down":  # подходящие A — начало ascending
+        i = _boundary(check, ascending[::-1])
+        good = ascending[:len(ascending) - i]
+    elif cfg.objective == "all":
+        return [A for A, ok in zip(points, check(points)) if ok]
+    else:
+        A = _first_good(check, ascending if cfg.objective == "min" else ascending[::-1])
+        return [] if A is None else [A]
+
+    if cfg.objective == "all":
+        return list(good if points.step > 0 else good[::-1])
     if not good:
         return []
-    return [min(good)] if cfg.objective == "min" else [max(good)]
+    return [good[0]] if cfg.objective == "min" else [good[-1]]
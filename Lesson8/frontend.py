@@ -52,10 +52,20 @@ class MainWindow(QtWidgets.QMainWindow):
         self.ed_A_to = QtWidgets.QLineEdit("200")
         self.ed_A_step = QtWidgets.QLineEdit("1")
 
+        self.cb_mono = QtWidgets.QComboBox()
+        self.cb_mono.addItems(["auto", "up", "down", "no"])
+        self.cb_mono.setCurrentText("auto")
+        self.cb_mono.setToolTip(
+            "Монотонность условия по A (для min/max — бинарный поиск вместо перебора):\n"
+            "up — если A подходит, подходят и все большие; down — все меньшие;\n"
+            "auto — определить по формуле; no — перебирать A"
+        )
+
         cfg_l.addRow("Искать A:", self.cb_obj)
         cfg_l.addRow("A от:", self.ed_A_from)
         cfg_l.addRow("A до:", self.ed_A_to)
         cfg_l.addRow("A шаг:", self.ed_A_step)
+        cfg_l.addRow("Монотонность:", self.cb_mono)
 
         side.addWidget(cfg_box)
 
@@ -168,6 +178,7 @@ class MainWindow(QtWidgets.QMainWindow):
                 a_domain=A_dom,
                 objective=self.cb_obj.currentText(),
                 a_name="A",
+                monotone=self.cb_mono.currentText(),
             )
 
             ans = backend.solve(cfg)